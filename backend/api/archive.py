@@ -0,0 +1,71 @@
+"""
+Moves dead rows out of the Item table into ArchivedItem.
+
+Each batch is a single ``WITH moved AS (DELETE ... RETURNING) INSERT ...``
+statement over at most batch_size rows locked with SKIP LOCKED, so the hot
+table shrinks back to live inventory without long transactions or
+contention with reservations.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ITEM_AVAILABLE, ArchivedItem, Item
+
+
+def _move(candidates, reason):
+    """
+    Move the rows selected by candidates, a select_for_update(skip_locked=True)
+    queryset of primary keys, to ArchivedItem. Returns the number of rows moved.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in Item._meta.concrete_fields)
+    with transaction.atomic():
+        sql, params = candidates.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH moved AS ("
+                f"DELETE FROM {quote(Item._meta.db_table)} WHERE {quote('id')} IN ({sql}) "
+                f"RETURNING {columns}) "
+                f"INSERT INTO {quote(ArchivedItem._meta.db_table)} "
+                f"({columns}, {quote('archived_at')}, {quote('archive_reason')}) "
+                f"SELECT {columns}, %s, %s FROM moved",
+                [*params, timezone.now(), reason]
+            )
+            return cursor.rowcount
+
+
+def archive_expired(batch_size):
+    """
+    Archive up to batch_size unreserved items past their best before date.
+    """
+    candidates = Item.objects.filter(
+        ITEM_AVAILABLE,
+        best_before__lt=timezone.localdate()
+    ).order_by('best_before')
+    candidates = candidates.select_for_update(skip_locked=True).values('pk')[:batch_size]
+    return _move(candidates, 'expired')
+
+
+def archive_picked_up(older_than_days, batch_size):
+    """
+    Archive up to batch_size items picked up more than older_than_days ago.
+    Items marked picked up without a pickup_time are aged by updated_at, the
+    last time the row changed, so they are archived too instead of staying
+    in the hot table forever.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    timed = Item.objects.filter(
+        is_picked_up=True,
+        pickup_time__lt=cutoff
+    ).order_by('pickup_time')
+    moved = _move(timed.select_for_update(skip_locked=True).values('pk')[:batch_size], 'picked_up')
+    if moved < batch_size:
+        untimed = Item.objects.filter(
+            is_picked_up=True,
+            pickup_time__isnull=True,
+            updated_at__lt=cutoff
+        ).order_by('updated_at')
+        moved += _move(untimed.select_for_update(skip_locked=True).values('pk')[:batch_size - moved], 'picked_up')
+    return moved
@@ -0,0 +1,94 @@
+"""
+Delta sync for organization listings: what changed in an area since a token.
+
+Every write to Item bumps its indexed ``updated_at`` (auto_now on save and
+bulk_create, explicitly in the raw UPDATEs of api.reservations). A change
+window ``(since, until]`` then yields:
+
+- upserts: items updated in the window that are still available
+- removals: items updated in the window that no longer are (reserved,
+  picked up), items whose best before date passed in the window, and items
+  moved to ArchivedItem in the window
+
+``until`` trails the clock by CHANGES_SETTLE_SECONDS so that a transaction
+which stamped its rows just before a poll but committed just after it is
+still picked up by the next poll. The token handed back is ``until``.
+"""
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.gis.measure import D
+from django.db.models import Q
+from django.utils import timezone
+
+from .listings import InvalidCursor, available_filter, project, within_radius
+from .models import ITEM_AVAILABLE, ArchivedItem, Item
+
+
+def encode_token(moment):
+    """
+    Encode a change window bound into an opaque token.
+    """
+    micros = int(moment.timestamp() * 1_000_000)
+    return base64.urlsafe_b64encode(str(micros).encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """
+    Decode a token produced by encode_token.
+    Returns an aware datetime, raises InvalidCursor on malformed input.
+    """
+    try:
+        micros = int(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    except (binascii.Error, ValueError, OverflowError, OSError):
+        raise InvalidCursor("Invalid token")
+
+
+def settled_now():
+    """
+    Upper bound of the next change window.
+    """
+    return timezone.now() - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+
+
+async def achanges_since(location, radius_m, category, since, until, limit):
+    """
+    Changes to items within radius_m of location in (since, until].
+    Returns (upsert rows as in project, removed item ids, truncated); when
+    truncated is True the window held more than limit changes and the client
+    should resync in full instead.
+    """
+    changed = Item.objects.filter(updated_at__gt=since, updated_at__lte=until)
+    if category is not None:
+        changed = changed.filter(category=category)
+
+    upserts = project(within_radius(changed.filter(available_filter()), location, radius_m))
+    upsert_rows = [row async for row in upserts[:limit + 1]]
+
+    in_area = Q(pickup_location__dwithin=(location, D(m=radius_m)))
+    category_filter = Q() if category is None else Q(category=category)
+    no_longer_available = changed.filter(in_area).exclude(available_filter())
+    expired = Item.objects.filter(
+        ITEM_AVAILABLE,
+        in_area,
+        category_filter,
+        best_before__gte=timezone.localdate(since),
+        best_before__lt=timezone.localdate(until)
+    )
+    archived = ArchivedItem.objects.filter(
+        in_area,
+        category_filter,
+        archived_at__gt=since,
+        archived_at__lte=until
+    )
+    removed = no_longer_available.values_list('pk', flat=True).union(
+        expired.values_list('pk', flat=True),
+        archived.values_list('pk', flat=True)
+    )
+    removed_ids = [item_id async for item_id in removed[:limit + 1]]
+
+    truncated = len(upsert_rows) + len(removed_ids) > limit
+    return upsert_rows, removed_ids, truncated
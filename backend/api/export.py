@@ -0,0 +1,78 @@
+"""
+Streaming export of available items for organization bulk sync.
+
+Rows are read through a server-side cursor (``aiterator(chunk_size=...)``)
+and written out as NDJSON or CSV while they arrive, so memory stays constant
+however many items match. The generators are async on purpose: under ASGI a
+synchronous iterator handed to StreamingHttpResponse is consumed in full
+before the first byte is sent.
+"""
+import csv
+import json
+
+from .listings import LISTING_COLUMNS, project, serialize_listing
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+CSV_HEADER = (
+    'id', 'category', 'description', 'weight', 'weight_unit', 'volume', 'volume_unit',
+    'best_before', 'pickup_time', 'posted_by_id', 'posted_by_username',
+    'longitude', 'latitude', 'distance_km',
+)
+
+
+class _Echo:
+    """
+    File-like object whose write returns the line, so csv.writer can format
+    rows without buffering them.
+    """
+    def write(self, value):
+        return value
+
+
+def _ndjson_line(row):
+    return json.dumps(serialize_listing(row), separators=(',', ':')) + '\n'
+
+
+def _csv_row(row):
+    (item_id, category, description, weight, weight_unit, volume, volume_unit,
+     best_before, pickup_time, poster_id, poster_username,
+     longitude, latitude, distance_m) = row
+
+    return (
+        item_id, category, description, weight, weight_unit, volume, volume_unit,
+        best_before.isoformat() if best_before else '',
+        pickup_time.isoformat() if pickup_time else '',
+        poster_id, poster_username, longitude, latitude, round(distance_m / 1000, 2),
+    )
+
+
+async def astream_items(queryset, export_format, chunk_size):
+    """
+    Yield a within_radius queryset as export_format text, one chunk of up to
+    chunk_size rows at a time.
+    """
+    rows = project(queryset, LISTING_COLUMNS).aiterator(chunk_size=chunk_size)
+
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(CSV_HEADER)
+
+        def format_row(row):
+            return writer.writerow(_csv_row(row))
+    else:
+        format_row = _ndjson_line
+
+    # A database error mid-stream propagates and aborts the response, so a
+    # client never mistakes a truncated export for a complete one.
+    lines = []
+    async for row in rows:
+        lines.append(format_row(row))
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
@@ -0,0 +1,93 @@
+"""
+Bounded worker pool for password hashing.
+
+PBKDF2 costs hundreds of milliseconds of CPU and releases the GIL while it
+runs, so login and signup hash on a small dedicated pool instead of the
+request thread or event loop. At most PASSWORD_HASHING_WORKERS +
+PASSWORD_HASHING_QUEUE_DEPTH jobs are admitted at once; anything beyond that
+is rejected immediately with HashingPoolSaturated so a login burst cannot
+starve the rest of the worker.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.db import connection
+
+from .metrics import HASHING_PENDING, HASHING_REJECTED, HASHING_RUN_SECONDS, HASHING_WAIT_SECONDS
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+    thread_name_prefix='password-hashing'
+)
+_slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASHING_WORKERS + settings.PASSWORD_HASHING_QUEUE_DEPTH
+)
+
+def _run(fn, args, submitted_at):
+    started_at = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        finished_at = time.perf_counter()
+        _slots.release()
+        HASHING_PENDING.dec()
+        HASHING_WAIT_SECONDS.observe(started_at - submitted_at)
+        HASHING_RUN_SECONDS.observe(finished_at - started_at)
+
+
+def submit(fn, *args):
+    """
+    Run fn(*args) on the hashing pool.
+    Returns a concurrent.futures.Future, raises HashingPoolSaturated when full.
+    """
+    if not _slots.acquire(blocking=False):
+        HASHING_REJECTED.inc()
+        raise HashingPoolSaturated("Password hashing pool is saturated")
+
+    HASHING_PENDING.inc()
+    return _executor.submit(_run, fn, args, time.perf_counter())
+
+
+def make_password(password):
+    return submit(hashers.make_password, password).result()
+
+
+def check_password(password, encoded):
+    return submit(hashers.check_password, password, encoded).result()
+
+
+async def amake_password(password):
+    return await asyncio.wrap_future(submit(hashers.make_password, password))
+
+
+async def acheck_password(password, encoded, setter=None):
+    """
+    Verify password on the pool. Like hashers.check_password, setter is
+    called (on the pool too) with the raw password when the stored hash
+    uses an outdated hasher or iteration count.
+    """
+    return await asyncio.wrap_future(submit(hashers.check_password, password, encoded, setter))
+
+
+def upgrade_setter(user):
+    """
+    check_password setter rehashing and saving user's password, as
+    User.check_password does.
+    """
+    def setter(raw_password):
+        user.set_password(raw_password)
+        try:
+            user.save(update_fields=['password'])
+        finally:
+            # Pool threads live on; don't leave a connection open on them
+            connection.close()
+    return setter
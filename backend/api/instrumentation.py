@@ -0,0 +1,87 @@
+"""
+Per-request counters for database queries, authentication and serialization.
+
+record_query is installed as an execute wrapper on every database connection
+(see ApiConfig.ready) and adds to the RequestStats of the current context,
+if any. Context variables follow a request into the threads sync_to_async
+runs ORM calls on, so queries are attributed to the right request under
+ASGI, and a context without stats costs one ContextVar lookup per query.
+Other phases are timed with measure(), a no-op outside tracked requests.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_seconds', 'auth_seconds', 'serialize_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.auth_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def current():
+    """
+    RequestStats of the current context, or None when nothing is tracking.
+    """
+    return _current.get()
+
+
+@contextmanager
+def track():
+    """
+    Collect RequestStats for the code run inside the block; nested blocks
+    share the outer stats.
+    """
+    stats = _current.get()
+    if stats is not None:
+        yield stats
+        return
+    stats = RequestStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def measure(field):
+    """
+    Add the time spent inside the block to a RequestStats field.
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(stats, field, getattr(stats, field) + time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver adding record_query to the connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
@@ -1,11 +1,24 @@
 from django.conf import settings
 import jwt
 import datetime
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
+from asgiref.sync import iscoroutinefunction
 from django.http import JsonResponse
 
+from .instrumentation import measure
+from .metrics import cache_lookup
+from .models import Organization, Samaritan
+
+# token -> (payload, profile, cached_until); bounded LRU shared by the worker's threads
+_verified_tokens = OrderedDict()
+_verified_tokens_lock = threading.Lock()
+
 def generate_jwt_token(input):
     payload = {
+        'user_id': input['user_id'],
         'username': input['username'],
         'email': input['email'],
         'is_staff': input['is_staff'],
@@ -14,70 +27,177 @@ def generate_jwt_token(input):
     }
     return jwt.encode(payload, settings.JWT_SECRET, algorithm='HS256')
 
+def _cached_principal(token):
+    with _verified_tokens_lock:
+        entry = _verified_tokens.get(token)
+        if entry is None:
+            return None
+        if entry[2] <= time.time():
+            del _verified_tokens[token]
+            return None
+        _verified_tokens.move_to_end(token)
+        return entry
+
+def _cache_principal(token, payload, profile):
+    # Never outlive the token itself; the TTL bounds how stale a cached profile can get
+    cached_until = min(payload['exp'], time.time() + settings.TOKEN_CACHE_TTL)
+    with _verified_tokens_lock:
+        _verified_tokens[token] = (payload, profile, cached_until)
+        _verified_tokens.move_to_end(token)
+        while len(_verified_tokens) > settings.TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
+
+def _profile_queryset(payload):
+    """
+    Queryset selecting the Organization or Samaritan behind a verified token
+    payload. Tokens issued before user_id was added are resolved by username.
+    """
+    model = Organization if payload['user_type'] == 'organization' else Samaritan
+    if payload.get('user_id') is not None:
+        return model.objects.filter(pk=payload['user_id'])
+    return model.objects.filter(username=payload['username'])
+
+def _decode(token):
+    return jwt.decode(
+        token, 
+        settings.JWT_SECRET, 
+        algorithms=['HS256']
+    )
+
+def _get_token(request):
+    token = request.COOKIES.get('jwt')
+    if not token:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return None
+        token = auth_header.split(' ')[1]
+    return token
+
+def _authorize(request, token, payload, profile, allowed_user_types):
+    """
+    Attach the principal to the request.
+    Returns an error response if the user type is not allowed, else None.
+    """
+    request.username = payload['username']
+    request.user_email = payload['email']
+    request.is_staff = payload['is_staff']
+    request.user_type = payload['user_type']
+    request.user_id = profile.pk
+    request.profile = profile
+    request.auth_token = token
+    
+    # Check user type if specified
+    if allowed_user_types and request.user_type not in allowed_user_types:
+        return JsonResponse({
+            'error': 'Unauthorized user type',
+            'required_types': allowed_user_types, 
+            'current_type': request.user_type
+        }, status=403)
+    return None
+
+def _auth_error(e):
+    if isinstance(e, jwt.ExpiredSignatureError):
+        return JsonResponse({
+            'error': 'Token has expired'
+        }, status=401)
+    if isinstance(e, jwt.InvalidTokenError):
+        return JsonResponse({
+            'error': 'Invalid token'
+        }, status=401)
+    if isinstance(e, KeyError):
+        return JsonResponse({
+            'error': f'Invalid token format: missing {str(e)}'
+        }, status=401)
+    return JsonResponse({
+        'error': 'User not found'
+    }, status=401)
+
+AUTH_ERRORS = (jwt.InvalidTokenError, KeyError, Organization.DoesNotExist, Samaritan.DoesNotExist)
+
+def authenticate_token(token):
+    """
+    Verify a token, going through the verified-token cache.
+    Returns (payload, profile); raises one of AUTH_ERRORS if it is not valid.
+    """
+    entry = _cached_principal(token)
+    cache_lookup('tokens', entry is not None)
+    if entry is not None:
+        return entry[0], entry[1]
+    payload = _decode(token)
+    profile = _profile_queryset(payload).get()
+    _cache_principal(token, payload, profile)
+    return payload, profile
+
+async def aauthenticate_token(token):
+    """
+    Async version of authenticate_token.
+    """
+    entry = _cached_principal(token)
+    cache_lookup('tokens', entry is not None)
+    if entry is not None:
+        return entry[0], entry[1]
+    payload = _decode(token)
+    profile = await _profile_queryset(payload).aget()
+    _cache_principal(token, payload, profile)
+    return payload, profile
+
+def forget_token(token):
+    with _verified_tokens_lock:
+        _verified_tokens.pop(token, None)
+
 def token_required(allowed_user_types=None):
     """
     Decorator to protect views with JWT authentication.
     Checks for JWT token in cookie first, then falls back to Authorization header.
+    Verified tokens are cached together with the resolved profile, which is
+    attached as request.profile (read-only, shared between requests) along
+    with its primary key as request.user_id. Coroutine views get an async
+    wrapper that resolves the profile through the async ORM.
     
     Parameters:
     allowed_user_types (list, optional): List of user types allowed to access the view.
     If None, all authenticated users are allowed.
     """
     def decorator(view_func):
-        @wraps(view_func)
-        def wrapped_view(request, *args, **kwargs):
-            # Get token from cookie or Authorization header
-            token = request.COOKIES.get('jwt')
-            if not token:
-                auth_header = request.headers.get('Authorization')
-                if not auth_header or not auth_header.startswith('Bearer '):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def wrapped_view(request, *args, **kwargs):
+                token = _get_token(request)
+                if not token:
                     return JsonResponse({
                         'error': 'No token provided'
                     }, status=401)
-                token = auth_header.split(' ')[1]
-            
-            try:
-                # Decode token
-                payload = jwt.decode(
-                    token, 
-                    settings.JWT_SECRET, 
-                    algorithms=['HS256']
-                )
                 
-                # Set user information in request
-                request.username = payload['username']
-                request.user_email = payload['email']
-                request.is_staff = payload['is_staff']
-                request.user_type = payload['user_type']
-                
-                # Check token expiration
-                exp_timestamp = payload['exp']
-                if datetime.datetime.now(datetime.timezone.utc).timestamp() > exp_timestamp:
-                    return JsonResponse({
-                        'error': 'Token has expired'
-                    }, status=401)
-                
-                # Check user type if specified
-                if allowed_user_types and request.user_type not in allowed_user_types:
-                    return JsonResponse({
-                        'error': 'Unauthorized user type',
-                        'required_types': allowed_user_types, 
-                        'current_type': request.user_type
-                    }, status=403)
+                try:
+                    with measure('auth_seconds'):
+                        payload, profile = await aauthenticate_token(token)
+                        error = _authorize(request, token, payload, profile, allowed_user_types)
+                except AUTH_ERRORS as e:
+                    return _auth_error(e)
+                if error is not None:
+                    return error
                 
-            except jwt.ExpiredSignatureError:
-                return JsonResponse({
-                    'error': 'Token has expired'
-                }, status=401)
-            except jwt.InvalidTokenError:
-                return JsonResponse({
-                    'error': 'Invalid token'
-                }, status=401)
-            except KeyError as e:
+                return await view_func(request, *args, **kwargs)
+            return wrapped_view
+        
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            # Get token from cookie or Authorization header
+            token = _get_token(request)
+            if not token:
                 return JsonResponse({
-                    'error': f'Invalid token format: missing {str(e)}'
+                    'error': 'No token provided'
                 }, status=401)
             
+            try:
+                with measure('auth_seconds'):
+                    payload, profile = authenticate_token(token)
+                    error = _authorize(request, token, payload, profile, allowed_user_types)
+            except AUTH_ERRORS as e:
+                return _auth_error(e)
+            if error is not None:
+                return error
+            
             return view_func(request, *args, **kwargs)
         return wrapped_view
     return decorator
@@ -0,0 +1,128 @@
+"""
+Response cache for the organization listings.
+
+Entries are encoded JSON bodies (see api.responses). They live in the
+``listings`` cache alias and are namespaced by a coarse lat/lon grid cell
+around the organization. Each cell carries a version stamp; writing an item
+bumps the version of every cell close enough for the item to appear in a
+cached radius, which orphans exactly the affected entries and leaves eviction
+of the rest to the backend.
+
+Version stamps are also bumped outside the API, by the reservation sweeper,
+so the alias must be a backend every process can see (Redis under compose,
+see settings.CACHES); a per-process cache only works for a single process.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import cache_lookup
+
+KM_PER_DEGREE = 111.32
+
+
+def _cache():
+    return caches[settings.LISTINGS_CACHE_ALIAS]
+
+
+def geo_cell(longitude, latitude):
+    """
+    Grid cell containing a point, as (column, row).
+    """
+    size = settings.LISTINGS_CACHE_CELL_DEGREES
+    return math.floor(longitude / size), math.floor(latitude / size)
+
+
+def cells_around(longitude, latitude, radius_km):
+    """
+    All grid cells intersecting the bounding box of radius_km around a point.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    lon_delta = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+
+    min_col, min_row = geo_cell(longitude - lon_delta, latitude - lat_delta)
+    max_col, max_row = geo_cell(longitude + lon_delta, latitude + lat_delta)
+    return [
+        (col, row)
+        for col in range(min_col, max_col + 1)
+        for row in range(min_row, max_row + 1)
+    ]
+
+
+def _version_key(cell):
+    return 'listings:v:%d:%d' % cell
+
+
+async def _cell_version(cell):
+    cache = _cache()
+    key = _version_key(cell)
+    version = await cache.aget(key)
+    if version is None:
+        # A missing (or evicted) version starts a fresh namespace, so stale
+        # entries written under an older stamp can never be served again.
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def is_cacheable(radius_km):
+    return radius_km <= settings.LISTINGS_CACHE_MAX_RADIUS_KM
+
+
+async def alisting_key(organization, radius_km, category, cursor, items_per_page, count_mode):
+    """
+    Cache key for one listings response of an organization.
+    """
+    location = organization.location
+    cell = geo_cell(location.x, location.y)
+    return 'listings:body:%d:%d:%s:%s:%s:%s:%s:%s:%s' % (
+        cell[0], cell[1], await _cell_version(cell), organization.pk,
+        radius_km, category, cursor, items_per_page, count_mode
+    )
+
+
+async def aget_listing(key):
+    body = await _cache().aget(key)
+    cache_lookup('listings', body is not None)
+    return body
+
+
+async def aset_listing(key, data):
+    await _cache().aset(key, data)
+
+
+def invalidate_point(longitude, latitude):
+    """
+    Drop every cached listing that could include an item at this point.
+    """
+    invalidate_points([(longitude, latitude)])
+
+
+def _version_stamps(points):
+    version = time.time_ns()
+    return {
+        _version_key(cell): version
+        for longitude, latitude in points
+        for cell in cells_around(longitude, latitude, settings.LISTINGS_CACHE_MAX_RADIUS_KM)
+    }
+
+
+def invalidate_points(points):
+    """
+    invalidate_point for many (longitude, latitude) pairs in one cache write.
+    """
+    stamps = _version_stamps(points)
+    if stamps:
+        _cache().set_many(stamps, timeout=None)
+
+
+async def ainvalidate_point(longitude, latitude):
+    await ainvalidate_points([(longitude, latitude)])
+
+
+async def ainvalidate_points(points):
+    stamps = _version_stamps(points)
+    if stamps:
+        await _cache().aset_many(stamps, timeout=None)
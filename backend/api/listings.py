@@ -0,0 +1,241 @@
+"""
+Query helpers for the organization item listings.
+
+Listings are paginated with an opaque keyset cursor over ``(distance, id)``
+instead of ``Paginator``, so every page costs the same regardless of how far
+the client has scrolled and no ``COUNT(*)`` is needed to render it.
+
+The radius filter is an ST_DWithin on the geography column and ordering uses
+the PostGIS ``<->`` KNN operator, both served by the GiST index on
+``Item.pickup_location``.
+
+Rows are fetched as plain tuples of exactly the columns a response needs,
+poster username and distance included, and serialized without instantiating
+models.
+"""
+import base64
+import binascii
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.gis.measure import D
+from django.db.models import F, FloatField, Func, Q, Value
+from django.utils import timezone
+
+from .models import ITEM_AVAILABLE, Item
+
+CATEGORY_NAMES = dict(Item.CATEGORY_CHOICES)
+
+# Every projection starts with the item id and ends with distance_m so that
+# page_after can build the cursor from any of them.
+LISTING_COLUMNS = (
+    'id', 'category', 'description', 'weight', 'weight_unit', 'volume', 'volume_unit',
+    'best_before', 'pickup_time', 'posted_by_id', 'posted_by__username',
+    'longitude', 'latitude', 'distance_m',
+)
+ITEM_COLUMNS = (
+    'id', 'category', 'description', 'weight', 'weight_unit', 'volume', 'volume_unit',
+    'best_before', 'reserved_till', 'posted_by_id', 'pickup_time', 'is_picked_up',
+    'longitude', 'latitude', 'distance_m',
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KNNDistance(Func):
+    """
+    ``field <-> point`` on a geography column: the distance in metres, usable
+    as an index-assisted ORDER BY.
+    """
+    template = '%(expressions)s'
+    arg_joiner = ' <-> '
+    output_field = FloatField()
+
+    def __init__(self, field, point):
+        point = Func(Value(point.ewkt), template='%(expressions)s::geography')
+        super().__init__(F(field), point)
+
+
+def encode_cursor(distance, item_id):
+    """
+    Encode the sort key of the last row of a page into an opaque cursor.
+    """
+    raw = json.dumps([distance, item_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+    Returns (distance, item_id), raises InvalidCursor on malformed input.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        distance, item_id = json.loads(raw)
+        return float(distance), int(item_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def available_filter():
+    """
+    Q matching items that can still be claimed by an organization:
+    unreserved, not picked up and not past their best before date.
+    """
+    return ITEM_AVAILABLE & (Q(best_before__isnull=True) | Q(best_before__gte=timezone.localdate()))
+
+
+def available_items():
+    return Item.objects.filter(available_filter())
+
+
+def within_radius(queryset, location, radius_m):
+    """
+    Restrict an item queryset to radius_m metres around location, annotated
+    with distance_m and ordered by (distance_m, id).
+    """
+    return queryset.filter(
+        pickup_location__dwithin=(location, D(m=radius_m))
+    ).annotate(
+        distance_m=KNNDistance('pickup_location', location)
+    ).order_by('distance_m', 'id')
+
+
+def nearby_items(location, radius_m, category=None):
+    """
+    Available items within radius_m metres of location, see within_radius.
+    """
+    queryset = available_items()
+    if category is not None:
+        queryset = queryset.filter(category=category)
+
+    return within_radius(queryset, location, radius_m)
+
+
+def project(queryset, columns=LISTING_COLUMNS):
+    """
+    Turn a queryset from within_radius into a tuple queryset of columns,
+    with the pickup point split into plain longitude/latitude floats.
+    """
+    return queryset.annotate(
+        longitude=Func(F('pickup_location'), template='ST_X(%(expressions)s::geometry)', output_field=FloatField()),
+        latitude=Func(F('pickup_location'), template='ST_Y(%(expressions)s::geometry)', output_field=FloatField()),
+    ).values_list(*columns)
+
+
+def serialize_listing(row):
+    """
+    Build the listing response entry for a LISTING_COLUMNS row.
+    """
+    (item_id, category, description, weight, weight_unit, volume, volume_unit,
+     best_before, pickup_time, poster_id, poster_username,
+     longitude, latitude, distance_m) = row
+
+    item_data = {
+        'id': item_id,
+        'category': {
+            'id': category,
+            'name': CATEGORY_NAMES[category]
+        },
+        'description': description,
+        'pickup_location': {
+            'latitude': latitude,
+            'longitude': longitude
+        },
+        'distance_km': round(distance_m / 1000, 2),
+        'posted_by': {
+            'id': poster_id,
+            'username': poster_username
+        }
+    }
+
+    if weight is not None:
+        item_data['weight'] = {'value': float(weight), 'unit': weight_unit}
+
+    if volume is not None:
+        item_data['volume'] = {'value': float(volume), 'unit': volume_unit}
+
+    if best_before is not None:
+        item_data['best_before'] = best_before.isoformat()
+
+    if pickup_time is not None:
+        item_data['pickup_time'] = pickup_time.isoformat()
+
+    return item_data
+
+
+def serialize_item(row):
+    """
+    Build the ItemView response entry for an ITEM_COLUMNS row.
+    """
+    (item_id, category, description, weight, weight_unit, volume, volume_unit,
+     best_before, reserved_till, poster_id, pickup_time, is_picked_up,
+     longitude, latitude, distance_m) = row
+
+    return {
+        "id": item_id,
+        "category": category,
+        "description": description,
+        "weight": weight,
+        "weight_unit": weight_unit,
+        "volume": volume,
+        "volume_unit": volume_unit,
+        "best_before": best_before,
+        "pickup_location": {
+            "latitude": latitude,
+            "longitude": longitude
+        },
+        "distance_km": round(distance_m / 1000, 2),
+        "reserved_till": reserved_till,
+        "posted_by": poster_id,
+        "pickup_time": pickup_time,
+        "is_picked_up": is_picked_up,
+    }
+
+
+def _after_cursor(queryset, cursor):
+    if cursor is None:
+        return queryset
+    distance, item_id = decode_cursor(cursor)
+    return queryset.filter(
+        Q(distance_m__gt=distance) | Q(distance_m=distance, id__gt=item_id)
+    )
+
+
+def _finish_page(rows, limit):
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[-1], last[0])
+
+
+def page_after(queryset, cursor, limit):
+    """
+    Fetch one page of a projected queryset, starting after cursor.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = _after_cursor(queryset, cursor)
+    return _finish_page(list(queryset[:limit + 1]), limit)
+
+
+async def apage_after(queryset, cursor, limit):
+    """
+    Async version of page_after.
+    """
+    queryset = _after_cursor(queryset, cursor)
+    return _finish_page([row async for row in queryset[:limit + 1]], limit)
+
+
+def estimate_count(queryset):
+    """
+    Row estimate for a queryset taken from the planner instead of COUNT(*).
+    """
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+aestimate_count = sync_to_async(estimate_count)
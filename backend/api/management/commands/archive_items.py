@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api.archive import archive_expired, archive_picked_up
+
+
+class Command(BaseCommand):
+    help = 'Move expired and long picked-up items from Item into ArchivedItem, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Items moved per transaction')
+        parser.add_argument('--picked-up-days', type=int, default=30,
+                            help='Archive items picked up more than this many days ago')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, archiving every INTERVAL seconds (0 = run once and exit)')
+
+    def drain(self, archive_batch, batch_size):
+        moved = 0
+        while True:
+            count = archive_batch(batch_size)
+            moved += count
+            if count < batch_size:
+                return moved
+
+    def archive(self, batch_size, picked_up_days):
+        expired = self.drain(archive_expired, batch_size)
+        picked_up = self.drain(
+            lambda size: archive_picked_up(picked_up_days, size), batch_size
+        )
+        self.stdout.write(f'Archived {expired} expired and {picked_up} picked-up items')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            close_old_connections()
+            try:
+                self.archive(options['batch_size'], options['picked_up_days'])
+            except Exception as e:
+                if not interval:
+                    raise
+                self.stderr.write(f'Archiving failed: {str(e)}')
+            if not interval:
+                return
+            time.sleep(interval)
@@ -0,0 +1,264 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone as dt_timezone
+from http.cookies import SimpleCookie
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+
+from api import instrumentation
+from api.models import Organization, Samaritan, User
+from api.signup import create_account
+
+DEFAULT_MIX = 'listings=60,categories=20,donate=15,login=5'
+BENCH_PASSWORD = 'bench-password-123'
+# Centre of the default create_dummy_data bounding box
+BENCH_LOCATION = (-82.7, 42.15)
+
+
+def parse_mix(value):
+    """
+    Parse 'name=weight,...' into {name: weight}.
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise CommandError(f"Unknown operation '{name}', expected one of {', '.join(OPERATIONS)}")
+        try:
+            mix[name.strip()] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}'")
+    if not any(weight > 0 for weight in mix.values()):
+        raise CommandError('The mix needs at least one positive weight')
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def donation(rng):
+    return {
+        'category': rng.randrange(10),
+        'description': 'Benchmark donation',
+        'pickup_location': {
+            'longitude': BENCH_LOCATION[0] + rng.uniform(-0.1, 0.1),
+            'latitude': BENCH_LOCATION[1] + rng.uniform(-0.1, 0.1),
+        },
+    }
+
+
+def login_body(rng):
+    return {'username': 'bench_samaritan', 'password': BENCH_PASSWORD}
+
+
+# Operation name -> (method, path, persona, body factory)
+OPERATIONS = {
+    'listings': ('GET', '/listings?radius=10', 'organization', None),
+    'categories': ('GET', '/categories', 'organization', None),
+    'donate': ('POST', '/samaritan/donate', 'samaritan', donation),
+    'login': ('POST', '/auth/login', None, login_body),
+}
+
+
+class InProcessTarget:
+    """
+    Sends requests to the ASGI application in this process; database
+    queries are counted through api.instrumentation.
+    """
+    def __init__(self, host):
+        self.client = AsyncClient(headers={'host': host})
+
+    async def request(self, method, path, body, headers):
+        with instrumentation.track() as stats:
+            if method == 'GET':
+                response = await self.client.get(path, headers=headers)
+            else:
+                response = await self.client.post(
+                    path, data=json.dumps(body), content_type='application/json', headers=headers
+                )
+        return response.status_code, response.cookies.get('jwt'), stats.queries
+
+
+class HttpTarget:
+    """
+    Sends requests to a running server; queries are not observable.
+    """
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def _send(self, method, path, body, headers):
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers={
+            'Content-Type': 'application/json', **headers
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                response.read()
+                status, raw_cookies = response.status, response.headers.get_all('Set-Cookie') or []
+        except urllib.error.HTTPError as e:
+            e.read()
+            status, raw_cookies = e.code, []
+        cookies = SimpleCookie()
+        for raw in raw_cookies:
+            cookies.load(raw)
+        return status, cookies.get('jwt'), None
+
+    async def request(self, method, path, body, headers):
+        return await asyncio.to_thread(self._send, method, path, body, headers)
+
+
+class Command(BaseCommand):
+    help = 'Replay a weighted request mix against the API and report latency, throughput and queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Total requests to send')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default {DEFAULT_MIX})')
+        parser.add_argument('--base-url', help='Benchmark a running server instead of the in-process ASGI app')
+        parser.add_argument('--host', default=None, help='Host header for in-process requests')
+        parser.add_argument('--seed-users', type=int, default=0, help='Seed samaritans first (create_dummy_data)')
+        parser.add_argument('--seed-orgs', type=int, default=0, help='Seed organizations first')
+        parser.add_argument('--seed-items', type=int, default=0, help='Seed items first')
+        parser.add_argument('--seed-workers', type=int, default=1, help='Workers used to seed items')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for data and the request sequence')
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare against a previous --output file')
+
+    def ensure_account(self, model, username, **profile_fields):
+        if not User.objects.filter(username=username).exists():
+            create_account(model, username, f'{username}@example.com', BENCH_PASSWORD, **profile_fields)
+
+    async def login(self, target, username):
+        status, token, _ = await target.request(
+            'POST', '/auth/login', {'username': username, 'password': BENCH_PASSWORD}, {}
+        )
+        if status != 200 or token is None:
+            raise CommandError(f'Could not log in as {username} (status {status})')
+        return {'Authorization': f'Bearer {token.value}'}
+
+    async def run(self, target, mix, total, concurrency, seed):
+        rng = random.Random(seed)
+        operations = rng.choices(list(mix), weights=list(mix.values()), k=total)
+        personas = {
+            'organization': await self.login(target, 'bench_organization'),
+            'samaritan': await self.login(target, 'bench_samaritan'),
+            None: {},
+        }
+        samples = {name: [] for name in mix}
+        queue = iter(operations)
+
+        async def worker():
+            for name in queue:
+                method, path, persona, body_factory = OPERATIONS[name]
+                body = body_factory(rng) if body_factory else None
+                started = time.perf_counter()
+                try:
+                    status, _, queries = await target.request(method, path, body, personas[persona])
+                except Exception as e:
+                    self.stderr.write(f'{name} failed: {str(e)}')
+                    status, queries = None, None
+                samples[name].append((time.perf_counter() - started, status, queries))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return samples, time.perf_counter() - started
+
+    def summarize(self, samples, elapsed):
+        operations = {}
+        for name, rows in samples.items():
+            if not rows:
+                continue
+            latencies = sorted(latency * 1000 for latency, _, _ in rows)
+            queries = [count for _, _, count in rows if count is not None]
+            statuses = {}
+            for _, status, _ in rows:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            operations[name] = {
+                'requests': len(rows),
+                'errors': sum(1 for _, status, _ in rows if status is None or status >= 400),
+                'statuses': statuses,
+                'p50_ms': round(percentile(latencies, 0.50), 2),
+                'p95_ms': round(percentile(latencies, 0.95), 2),
+                'p99_ms': round(percentile(latencies, 0.99), 2),
+                'mean_ms': round(statistics.fmean(latencies), 2),
+                'queries_per_request': round(statistics.fmean(queries), 2) if queries else None,
+            }
+        total = sum(len(rows) for rows in samples.values())
+        return {
+            'requests': total,
+            'elapsed_seconds': round(elapsed, 3),
+            'throughput_rps': round(total / elapsed, 1) if elapsed else None,
+            'operations': operations,
+        }
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+
+        if options['seed_users'] or options['seed_orgs'] or options['seed_items']:
+            call_command(
+                'create_dummy_data', users=options['seed_users'], orgs=options['seed_orgs'],
+                items=options['seed_items'], workers=options['seed_workers'], seed=options['seed'],
+                distribution='city', stdout=self.stdout
+            )
+
+        # A --base-url server must use this database for these accounts to exist
+        self.ensure_account(Organization, 'bench_organization', name='Benchmark Organization',
+                            location=Point(*BENCH_LOCATION, srid=4326))
+        self.ensure_account(Samaritan, 'bench_samaritan')
+
+        if options['base_url']:
+            target = HttpTarget(options['base_url'])
+            mode = 'http'
+        else:
+            host = options['host'] or next((h for h in settings.ALLOWED_HOSTS if h and h != '*'), 'localhost')
+            target = InProcessTarget(host)
+            mode = 'in-process'
+
+        samples, elapsed = asyncio.run(
+            self.run(target, mix, options['requests'], options['concurrency'], options['seed'])
+        )
+        results = {
+            'timestamp': datetime.now(dt_timezone.utc).isoformat(),
+            'mode': mode,
+            'concurrency': options['concurrency'],
+            'mix': mix,
+            **self.summarize(samples, elapsed),
+        }
+
+        self.stdout.write(f"{results['requests']} requests in {results['elapsed_seconds']}s "
+                          f"({results['throughput_rps']} req/s, {mode}, concurrency {options['concurrency']})")
+        self.stdout.write(f"{'operation':<12}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}"
+                          f"{'p99 ms':>10}{'queries':>9}")
+        for name, stats in results['operations'].items():
+            queries = '-' if stats['queries_per_request'] is None else stats['queries_per_request']
+            self.stdout.write(f"{name:<12}{stats['requests']:>7}{stats['errors']:>8}{stats['p50_ms']:>10}"
+                              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{queries:>9}")
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            for name, stats in results['operations'].items():
+                before = baseline.get('operations', {}).get(name)
+                if before:
+                    change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+                    self.stdout.write(f"{name:<12} p95 {before['p95_ms']} -> {stats['p95_ms']} ms ({change:+.1f}%)")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
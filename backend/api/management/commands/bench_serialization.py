@@ -0,0 +1,71 @@
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.utils import timezone
+
+from api import responses
+from api.listings import serialize_listing
+from api.models import Item
+
+
+def listing_rows(count):
+    """
+    Synthetic LISTING_COLUMNS rows shaped like real listings.
+    """
+    today = date.today()
+    now = timezone.now()
+    return [
+        (
+            i, i % 10, f'Donated item number {i} with a short description', Decimal('12.50'), 'kg',
+            Decimal('3.25') if i % 2 else None, 'l', today + timedelta(days=i % 14),
+            now + timedelta(hours=i % 48), 1000 + i % 50, f'samaritan{i % 50}',
+            -79.38 + i * 1e-4, 43.65 + i * 1e-4, 25.0 * i,
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare JsonResponse with FastJsonResponse on listing-shaped payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=10,
+                            help='Items per response')
+        parser.add_argument('--requests', type=int, default=20000,
+                            help='Responses built per encoder')
+
+    def bench(self, build, requests):
+        start = time.perf_counter()
+        for _ in range(requests):
+            build()
+        return (time.perf_counter() - start) / requests * 1_000_000
+
+    def handle(self, *args, **options):
+        page_size = options['page_size']
+        requests = options['requests']
+
+        payload = {
+            'items': [serialize_listing(row) for row in listing_rows(page_size)],
+            'next_cursor': 'WzEyMy40LDEwXQ',
+            'categories': dict(Item.CATEGORY_CHOICES),
+            'generated_at': datetime.now(),
+        }
+
+        results = [('JsonResponse', self.bench(lambda: JsonResponse(payload), requests))]
+        for backend, dumps in responses.BACKENDS.items():
+            if backend == 'orjson' and responses.orjson is None:
+                self.stdout.write('orjson is not installed, skipping')
+                continue
+            results.append((
+                f'FastJsonResponse ({backend})',
+                self.bench(lambda: responses.FastJsonResponse(body=dumps(payload)), requests)
+            ))
+
+        baseline = results[0][1]
+        self.stdout.write(f'{page_size} items per response, {requests} responses each, '
+                          f'active backend: {responses.get_backend()}')
+        for name, micros in results:
+            self.stdout.write(f'{name:<32} {micros:8.1f} us/response  {baseline / micros:5.2f}x')
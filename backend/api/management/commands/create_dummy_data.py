@@ -1,190 +1,357 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.gis.geos import Point
+from django.core.cache import caches
+from django.db import connection, connections
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from faker import Faker
+import argparse
+import io
+import itertools
+import math
+import multiprocessing
 import random
-import decimal
-import json
+import time
 
-from api.models import Item, Organization, Samaritan
+from api.models import Item, Organization, Samaritan, User
+
+# Windsor-Essex, as min_lon, min_lat, max_lon, max_lat
+DEFAULT_BBOX = (-82.9, 41.9, -82.5, 42.4)
+KM_PER_DEGREE = 111.32
+
+CATEGORY_WORDS = {
+    0: ['Pasta', 'Rice', 'Canned Food', 'Vegetables', 'Fruits'],
+    1: ['Shirt', 'Pants', 'Jacket', 'Sweater'],
+    2: ['Novel', 'Textbook', 'Cookbook', 'Picture Book'],
+    3: ['Chair', 'Table', 'Desk', 'Shelf'],
+    4: ['Utensils', 'Plates', 'Cups', 'Cutlery'],
+    5: ['Phone', 'Laptop', 'Tablet', 'Charger'],
+    6: ['Doll', 'Car', 'Board Game', 'Puzzle'],
+    7: ['Bandages', 'First Aid Kit', 'Supplies'],
+    8: ['Food Bowl', 'Toy', 'Bed', 'Leash'],
+    9: ['Miscellaneous'],
+}
+
+# Columns written by create_accounts after the user link, and by load_items
+PROFILE_FIELDS = {
+    Organization: ('name', 'location', 'service_radius_km'),
+    Samaritan: ('rating', 'city', 'province'),
+}
+ITEM_FIELDS = (
+    'category', 'description', 'weight', 'weight_unit', 'volume', 'volume_unit',
+    'best_before', 'pickup_location', 'reserved_till', 'posted_by', 'reserved_by',
+    'pickup_time', 'is_picked_up', 'created_at', 'updated_at',
+)
+# Items are generated in blocks, each from an RNG seeded by (seed, block) and
+# with ids fixed by position, so --workers only changes who loads which block
+ITEM_BLOCK_SIZE = 10000
+
+
+def copy_value(value):
+    """
+    Render a value in PostgreSQL COPY text format.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, Point):
+        return f'SRID=4326;POINT({value.x} {value.y})'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(cursor, model, fields, rows):
+    """
+    COPY rows (tuples ordered like fields) into the table of model.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(copy_value(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN', buffer)
+
+
+def allocate_ids(cursor, model, count):
+    """
+    Reserve count primary keys from the id sequence of model's table.
+    """
+    cursor.execute(
+        'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+        [model._meta.db_table, 'id', count]
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def reserve_id_range(cursor, model, count):
+    """
+    Reserve count consecutive primary keys from the id sequence of model's
+    table (count must be positive). Returns the first one.
+    """
+    table = model._meta.db_table
+    cursor.execute(
+        'SELECT setval(pg_get_serial_sequence(%s, %s), nextval(pg_get_serial_sequence(%s, %s)) + %s - 1)',
+        [table, 'id', table, 'id', count]
+    )
+    return cursor.fetchone()[0] - count + 1
+
+
+class PointSampler:
+    """
+    Deterministic point generator over a bounding box.
+
+    uniform: evenly spread over the box
+    clusters: equal-sized gaussian clusters around random centres
+    city: clusters whose sizes follow a Zipf law, like a big city with suburbs
+    """
+    def __init__(self, rng, distribution, bbox, centers, cluster_km):
+        self.rng = rng
+        self.distribution = distribution
+        self.bbox = bbox
+        self.centers = centers
+        self.cluster_km = cluster_km
+        weights = [1 / rank for rank in range(1, len(centers) + 1)]
+        if distribution == 'clusters':
+            weights = [1] * len(centers)
+        self.cum_weights = [sum(weights[:i + 1]) for i in range(len(weights))]
+        self.spread = [math.sqrt(weight / weights[0]) for weight in weights]
+
+    def point(self):
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        if self.distribution == 'uniform' or not self.centers:
+            return Point(self.rng.uniform(min_lon, max_lon), self.rng.uniform(min_lat, max_lat), srid=4326)
+
+        index = self.rng.choices(range(len(self.centers)), cum_weights=self.cum_weights)[0]
+        lon, lat = self.centers[index]
+        sigma_deg = self.cluster_km * self.spread[index] / KM_PER_DEGREE
+        latitude = max(-90.0, min(90.0, self.rng.gauss(lat, sigma_deg)))
+        longitude = self.rng.gauss(lon, sigma_deg / max(math.cos(math.radians(lat)), 0.01))
+        return Point(longitude, latitude, srid=4326)
+
+
+def item_rows(rng, sampler, count, poster_ids, organization_ids, descriptions, now):
+    """
+    Yield count Item rows ordered like ITEM_FIELDS, with a realistic mix of
+    available, reserved (some past their hold) and picked up items.
+    """
+    today = now.date()
+    for _ in range(count):
+        category = rng.randrange(10)
+        created_at = now - timedelta(minutes=rng.randrange(90 * 24 * 60))
+        best_before = today + timedelta(days=rng.randint(-10, 730)) if category == 0 else None
+        reserved_by_id = reserved_till = pickup_time = None
+        is_picked_up = False
+
+        state = rng.random()
+        if organization_ids and state >= 0.7:
+            reserved_by_id = rng.choice(organization_ids)
+            if state < 0.85:
+                # Some holds already lapsed, for the reservation sweeper
+                reserved_till = now + timedelta(minutes=rng.randint(-240, 24 * 60))
+            else:
+                pickup_time = min(created_at + timedelta(hours=rng.randint(1, 72)), now)
+                is_picked_up = True
+
+        volume = round(rng.uniform(0.1, 50), 2) if rng.random() < 0.5 else None
+        yield (
+            category,
+            rng.choice(descriptions[category]),
+            round(rng.uniform(0.1, 100), 2),
+            rng.choice(['kg', 'lbs']),
+            volume,
+            'm³' if volume is not None else None,
+            best_before,
+            sampler.point(),
+            reserved_till,
+            rng.choice(poster_ids),
+            reserved_by_id,
+            pickup_time,
+            is_picked_up,
+            created_at,
+            created_at,
+        )
+
+
+def load_items(blocks, first_id, options, poster_ids, organization_ids, centers, descriptions, now, forked=True):
+    """
+    Generate and COPY the given item blocks (see ITEM_BLOCK_SIZE); run once
+    per worker. Forked workers use (and close) their own connection,
+    otherwise the caller's is reused.
+    Returns the number of items created.
+    """
+    def rows():
+        for block in blocks:
+            start = block * ITEM_BLOCK_SIZE
+            count = min(ITEM_BLOCK_SIZE, options['items'] - start)
+            rng = random.Random(f"{options['seed']}:{block}")
+            sampler = PointSampler(rng, options['distribution'], options['bbox'], centers, options['cluster_km'])
+            block_rows = item_rows(rng, sampler, count, poster_ids, organization_ids, descriptions, now)
+            for offset, row in enumerate(block_rows):
+                yield (first_id + start + offset, *row)
+
+    pending = rows()
+    created = 0
+    try:
+        with connection.cursor() as cursor:
+            while True:
+                batch = list(itertools.islice(pending, options['batch_size']))
+                if not batch:
+                    break
+                copy_rows(cursor, Item, ('id',) + ITEM_FIELDS, batch)
+                created += len(batch)
+    finally:
+        if forked:
+            connections.close_all()
+    return created
+
+
+def bbox_arg(value):
+    try:
+        bbox = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+        raise argparse.ArgumentTypeError('bbox must be min_lon,min_lat,max_lon,max_lat')
+    return bbox
 
-User = get_user_model()
-fake = Faker()
 
 class Command(BaseCommand):
-    help = 'Generate dummy data for development environment'
+    help = 'Generate dummy data for development and load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Samaritans to create')
+        parser.add_argument('--orgs', type=int, default=3, help='Organizations to create')
+        parser.add_argument('--items', type=int, default=20, help='Items to create')
+        parser.add_argument('--distribution', choices=['uniform', 'clusters', 'city'], default='uniform',
+                            help='How organizations and items are spread over the bounding box')
+        parser.add_argument('--clusters', type=int, default=8,
+                            help='Number of cluster/city centres for clusters and city distributions')
+        parser.add_argument('--cluster-km', type=float, default=3.0,
+                            help='Spread (one standard deviation) of the largest cluster in km')
+        parser.add_argument('--bbox', type=bbox_arg, default=DEFAULT_BBOX,
+                            help='min_lon,min_lat,max_lon,max_lat (default Windsor-Essex)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed making the generated data reproducible')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel processes loading items')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Rows per COPY statement')
+        parser.add_argument('--password', default='test123', help='Password shared by all generated accounts')
+        parser.add_argument('--fixture', help='Also dump the api app to this fixture file (streamed by dumpdata)')
+        parser.add_argument('--credentials', default='user_credentials.txt',
+                            help="File listing sample logins; '' to skip it")
+
+    def create_accounts(self, cursor, model, count, user_type, profile_row, password, now, fake):
+        """
+        COPY count User rows plus their model rows.
+        Returns (ids, usernames) of the new accounts.
+        """
+        ids = allocate_ids(cursor, User, count)
+        users = []
+        for user_id in ids:
+            first_name, last_name = fake.first_name(), fake.last_name()
+            username = f'{fake.user_name()}{user_id}'
+            users.append((
+                user_id, password, False, username, first_name, last_name,
+                f'{username}@example.com', False, True, now, user_type,
+            ))
+        copy_rows(cursor, User, (
+            'id', 'password', 'is_superuser', 'username', 'first_name', 'last_name',
+            'email', 'is_staff', 'is_active', 'date_joined', 'user_type',
+        ), users)
+        profiles = [profile_row(user_id) for user_id in ids]
+        copy_rows(cursor, model, ('user',) + PROFILE_FIELDS[model], profiles)
+        return ids, [user[3] for user in users]
+
+    def write_credentials(self, path, password, organization_names, samaritan_names):
+        with open(path, 'w') as f:
+            f.write("User Credentials for Login:\n")
+            f.write("="*50 + "\n\n")
+            f.write(f"Every generated account uses the password: {password}\n\n")
+            for role, names in (('ORGANIZATION', organization_names), ('SAMARITAN', samaritan_names)):
+                for username in names[:10]:
+                    f.write(f"{role}\nUsername: {username}\n")
+                    f.write("-"*30 + "\n\n")
+
+    def handle(self, *args, **options):
+        if options['items'] and not options['users']:
+            raise CommandError('Items need at least one samaritan (--users)')
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
 
-    def generate_windsor_essex_point(self):
-        latitude = random.uniform(41.9, 42.4)
-        longitude = random.uniform(-82.9, -82.5)
-        return Point(longitude, latitude)
+        started = time.perf_counter()
+        seed = options['seed']
+        rng = random.Random(seed)
+        fake = Faker()
+        Faker.seed(seed)
+        now = timezone.now()
+
+        min_lon, min_lat, max_lon, max_lat = options['bbox']
+        centers = [
+            (rng.uniform(min_lon, max_lon), rng.uniform(min_lat, max_lat))
+            for _ in range(options['clusters'] if options['distribution'] != 'uniform' else 0)
+        ]
+        sampler = PointSampler(rng, options['distribution'], options['bbox'], centers, options['cluster_km'])
+        descriptions = {
+            category: [f'{fake.color_name()} {rng.choice(words)}' for _ in range(200)]
+            for category, words in CATEGORY_WORDS.items()
+        }
+        password = make_password(options['password'])
 
-    def handle(self, *args, **kwargs):
         self.stdout.write('Creating dummy data...')
-        
-        # Store credentials for separate file
-        credentials = []
-        created_users = [] 
-        all_data = []
-
-        # Create Users
-        users_data = []
-        for i in range(10):
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            username = fake.user_name()
-            email = fake.email()
-            plain_password = f"test123_{i}"
-            
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=plain_password,
-                first_name=first_name,
-                last_name=last_name,
-                is_admin=(i == 0)
-            )
-            created_users.append(user)
-
-            credentials.append({
-                'username': username,
-                'email': email,
-                'password': plain_password,
-                'is_admin': i == 0
-            })
-
-            users_data.append({
-                'model': 'api.user',
-                'pk': user.id,
-                'fields': {
-                    'username': user.username,
-                    'email': user.email,
-                    'password': user.password,
-                    'first_name': first_name,
-                    'last_name': last_name,
-                    'is_admin': user.is_admin,
-                    'is_active': True,
-                }
-            })
-
-        # Create Organizations
-        orgs_data = []
-        for i in range(3):
-            location = self.generate_windsor_essex_point()
-            org = Organization.objects.create(
-                user=created_users[i],  
-                name=fake.company(),
-                location=location
+        with connection.cursor() as cursor:
+            organization_ids, organization_names = self.create_accounts(
+                cursor, Organization, options['orgs'], 'organization',
+                lambda user_id: (user_id, fake.company(), sampler.point(), rng.choice([2, 5, 10, 25])),
+                password, now, fake
             )
-            orgs_data.append({
-                'model': 'api.organization',
-                'pk': org.id,
-                'fields': {
-                    'user': org.user.id,
-                    'name': org.name,
-                    'location': f'POINT({location.x} {location.y})'
-                }
-            })
-
-        # Create Samaritans
-        samaritans_data = []
-        for i in range(3, 6): 
-            samaritan = Samaritan.objects.create(
-                user=created_users[i], 
-                rating=decimal.Decimal(random.uniform(3.5, 5)).quantize(decimal.Decimal('0.01'))
+            samaritan_ids, samaritan_names = self.create_accounts(
+                cursor, Samaritan, options['users'], 'samaritan',
+                lambda user_id: (user_id, round(rng.uniform(3.5, 5), 2), fake.city(), 'ON'),
+                password, now, fake
             )
-            samaritans_data.append({
-                'model': 'api.samaritan',
-                'pk': samaritan.id,
-                'fields': {
-                    'user': samaritan.user.id,
-                    'rating': str(samaritan.rating)
-                }
-            })
-
-        # Create Items
-        items_data = []
-        category_descriptions = {
-            0: lambda: f"{fake.word()} {random.choice(['Pasta', 'Rice', 'Canned Food', 'Vegetables', 'Fruits'])}",
-            1: lambda: f"{fake.color_name()} {random.choice(['Shirt', 'Pants', 'Jacket', 'Sweater'])}",
-            2: lambda: f"{fake.catch_phrase()} - {fake.word()} Book",
-            3: lambda: f"{fake.color_name()} {random.choice(['Chair', 'Table', 'Desk', 'Shelf'])}",
-            4: lambda: f"{fake.word()} {random.choice(['Utensils', 'Plates', 'Cups', 'Cutlery'])}",
-            5: lambda: f"{fake.company()} {random.choice(['Phone', 'Laptop', 'Tablet', 'Charger'])}",
-            6: lambda: f"{fake.color_name()} {random.choice(['Doll', 'Car', 'Board Game', 'Puzzle'])}",
-            7: lambda: f"{fake.word()} {random.choice(['Bandages', 'First Aid Kit', 'Supplies'])}",
-            8: lambda: f"{fake.word()} {random.choice(['Food Bowl', 'Toy', 'Bed', 'Leash'])}",
-            9: lambda: fake.catch_phrase()
+        self.stdout.write(f'Created {len(organization_ids)} organizations and {len(samaritan_ids)} samaritans')
+
+        blocks = list(range(math.ceil(options['items'] / ITEM_BLOCK_SIZE)))
+        workers = min(options['workers'], max(len(blocks), 1))
+        first_id = None
+        if blocks:
+            with connection.cursor() as cursor:
+                first_id = reserve_id_range(cursor, Item, options['items'])
+        item_options = {
+            name: options[name] for name in ('items', 'seed', 'distribution', 'bbox', 'cluster_km', 'batch_size')
         }
+        jobs = [
+            (blocks[worker::workers], first_id, item_options, samaritan_ids, organization_ids, centers, descriptions, now)
+            for worker in range(workers)
+        ]
+        if workers == 1:
+            created = load_items(*jobs[0], forked=False)
+        else:
+            # Children open their own connections; never share the parent's
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                created = sum(pool.starmap(load_items, jobs))
+        self.stdout.write(f'Created {created} items')
 
-        for i in range(20):
-            posted_by = random.choice(created_users)
-            reserved_by = random.choice([None] + list(filter(lambda x: x != posted_by, created_users)))
-            
-            category = random.randint(0, 9)
-            description = category_descriptions[category]()
-            
-            best_before = fake.date_between(start_date='now', end_date='+2y') if category == 0 else None
-            reserved_till = fake.future_datetime(end_date='+30d') if reserved_by else None
-            pickup_time = fake.future_datetime(end_date='+15d') if random.choice([True, False]) else None
-            
-            pickup_location = self.generate_windsor_essex_point()
-            
-            item = Item.objects.create(
-                category=category,
-                description=description,
-                weight=decimal.Decimal(random.uniform(0.1, 100)).quantize(decimal.Decimal('0.01')),
-                weight_unit=random.choice(['kg', 'lbs']),
-                volume=decimal.Decimal(random.uniform(0.1, 50)).quantize(decimal.Decimal('0.01')),
-                volume_unit=random.choice(['m³', 'ft³']),
-                best_before=best_before,
-                pickup_location=pickup_location,
-                reserved_till=reserved_till,
-                posted_by=posted_by,
-                reserved_by=reserved_by,
-                pickup_time=pickup_time,
-                is_picked_up=bool(pickup_time)
-            )
-            items_data.append({
-                'model': 'api.item',
-                'pk': item.id,
-                'fields': {
-                    'category': item.category,
-                    'description': item.description,
-                    'weight': str(item.weight),
-                    'weight_unit': item.weight_unit,
-                    'volume': str(item.volume),
-                    'volume_unit': item.volume_unit,
-                    'best_before': item.best_before.isoformat() if item.best_before else None,
-                    'pickup_location': f'POINT({pickup_location.x} {pickup_location.y})',
-                    'reserved_till': item.reserved_till.isoformat() if item.reserved_till else None,
-                    'posted_by': item.posted_by.id,
-                    'reserved_by': item.reserved_by.id if item.reserved_by else None,
-                    'pickup_time': item.pickup_time.isoformat() if item.pickup_time else None,
-                    'is_picked_up': item.is_picked_up
-                }
-            })
-
-        # Combine all data
-        all_data = users_data + orgs_data + samaritans_data + items_data
-
-        # Write credentials to a separate file
-        with open('user_credentials.txt', 'w') as f:
-            f.write("User Credentials for Login:\n")
-            f.write("="*50 + "\n\n")
-            for cred in credentials:
-                role = 'ADMIN USER' if cred['is_admin'] else 'REGULAR USER'
-                f.write(f"{role}\n")
-                f.write(f"Username: {cred['username']}\n")
-                f.write(f"Email: {cred['email']}\n")
-                f.write(f"Password: {cred['password']}\n")
-                f.write("-"*30 + "\n\n")
-
-        # Write fixture data to json
-        with open('dummy_data.json', 'w') as f:
-            json.dump(all_data, f, indent=2)
-
-        self.stdout.write(self.style.SUCCESS('Successfully created dummy data'))
-        self.stdout.write(self.style.SUCCESS('User credentials saved to user_credentials.txt'))
\ No newline at end of file
+        with connection.cursor() as cursor:
+            for model in (User, Organization, Samaritan, Item):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+        caches[settings.LISTINGS_CACHE_ALIAS].clear()
+
+        if options['credentials']:
+            self.write_credentials(options['credentials'], options['password'], organization_names, samaritan_names)
+
+        if options['fixture']:
+            call_command('dumpdata', 'api', output=options['fixture'])
+            self.stdout.write(self.style.SUCCESS(f"Fixture written to {options['fixture']}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully created dummy data in {time.perf_counter() - started:.1f}s'
+        ))
+        if options['credentials']:
+            self.stdout.write(self.style.SUCCESS(f"User credentials saved to {options['credentials']}"))
@@ -0,0 +1,59 @@
+import io
+import os
+import pstats
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import profiler
+
+
+class Command(BaseCommand):
+    help = 'Mint profiling tokens and list or dump captured request profiles'
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+
+        token = subcommands.add_parser('token', help=f'Print a token for the {profiler.HEADER} header')
+        token.add_argument('--ttl', type=int, default=600, help='Seconds the token stays valid')
+        token.add_argument('--path', help='Only profile requests whose path starts with this')
+
+        subcommands.add_parser('list', help='List captured profiles, oldest first')
+
+        dump = subcommands.add_parser('dump', help='Print or export one profile')
+        dump.add_argument('name', help="Profile file name, or 'latest'")
+        dump.add_argument('--sort', default='cumulative', help='pstats sort key')
+        dump.add_argument('--limit', type=int, default=40, help='Rows to print')
+        dump.add_argument('--output', help='Copy the raw pstats file here (for snakeviz, flameprof, ...)')
+
+    def handle(self, *args, **options):
+        getattr(self, options['action'])(options)
+
+    def token(self, options):
+        self.stdout.write(profiler.make_token(options['ttl'], options['path']))
+        self.stderr.write(f"Send it as '{profiler.HEADER}: <token>'; valid for {options['ttl']}s")
+
+    def list(self, options):
+        names = profiler.list_profiles()
+        if not names:
+            self.stdout.write(f'No profiles in {settings.PROFILER_DIR}')
+        for name in names:
+            size = os.path.getsize(os.path.join(settings.PROFILER_DIR, name))
+            self.stdout.write(f'{name}  {size // 1024} KiB')
+
+    def dump(self, options):
+        names = profiler.list_profiles()
+        name = names[-1] if options['name'] == 'latest' and names else options['name']
+        if name not in names:
+            raise CommandError(f"No profile named '{options['name']}' in {settings.PROFILER_DIR}")
+        path = os.path.join(settings.PROFILER_DIR, name)
+
+        if options['output']:
+            shutil.copyfile(path, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Copied {name} to {options['output']}"))
+            return
+        report = io.StringIO()
+        stats = pstats.Stats(path, stream=report)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(report.getvalue())
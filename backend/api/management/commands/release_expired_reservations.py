@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from api import listing_cache
+from api.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = 'Release item reservations whose reserved_till has passed, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Reservations released per transaction')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running, sweeping every INTERVAL seconds (0 = sweep once and exit)')
+
+    def sweep(self, batch_size):
+        released = 0
+        while True:
+            rows = release_expired(batch_size)
+            if rows:
+                listing_cache.invalidate_points([(longitude, latitude) for _, longitude, latitude in rows])
+            released += len(rows)
+            if len(rows) < batch_size:
+                return released
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        interval = options['interval']
+
+        while True:
+            close_old_connections()
+            try:
+                released = self.sweep(batch_size)
+                if released or not interval:
+                    self.stdout.write(f'Released {released} expired reservations')
+            except Exception as e:
+                if not interval:
+                    raise
+                self.stderr.write(f'Reservation sweep failed: {str(e)}')
+            if not interval:
+                return
+            time.sleep(interval)
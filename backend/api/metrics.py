@@ -0,0 +1,77 @@
+"""
+Prometheus metrics, exposed at ``/metrics``.
+
+Under gunicorn, start.sh points PROMETHEUS_MULTIPROC_DIR at an empty
+directory before the workers start; every worker then writes its samples to
+memory-mapped files there and a scrape of any worker aggregates all of them
+(gunicorn.conf.py cleans up after workers that exit). Without the variable
+(runserver, management commands) metrics stay in process memory.
+"""
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+REQUESTS = Counter(
+    'api_requests_total', 'Requests handled, by route, method and status',
+    ['route', 'method', 'status']
+)
+REQUEST_SECONDS = Histogram(
+    'api_request_duration_seconds', 'Request latency by route',
+    ['route', 'method'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+REQUEST_QUERIES = Histogram(
+    'api_request_db_queries', 'Database queries per request by route',
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+REQUEST_DB_SECONDS = Histogram(
+    'api_request_db_seconds', 'Database time per request by route',
+    ['route'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+CACHE_LOOKUPS = Counter(
+    'api_cache_lookups_total', 'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result']
+)
+HASHING_PENDING = Gauge(
+    'api_password_hashing_pending', 'Password hashing jobs queued or running',
+    multiprocess_mode='livesum'
+)
+HASHING_WAIT_SECONDS = Histogram(
+    'api_password_hashing_wait_seconds', 'Time password hashing jobs spent queued',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+HASHING_RUN_SECONDS = Histogram(
+    'api_password_hashing_run_seconds', 'Time spent hashing or verifying one password',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+HASHING_REJECTED = Counter(
+    'api_password_hashing_rejected_total', 'Password hashing jobs rejected because the pool was full'
+)
+
+
+def cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def observe_request(route, method, status, seconds, stats):
+    REQUESTS.labels(route, method, status).inc()
+    REQUEST_SECONDS.labels(route, method).observe(seconds)
+    REQUEST_QUERIES.labels(route).observe(stats.queries)
+    REQUEST_DB_SECONDS.labels(route).observe(stats.query_seconds)
+
+
+def render():
+    """
+    Current metrics in the Prometheus text format.
+    Returns (body, content_type).
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,299 @@
+"""
+API middleware: metrics, per-request timing, profiling and response
+compression.
+
+MetricsMiddleware records every request's route, status, latency and
+database usage in the Prometheus metrics of api.metrics.
+
+ServerTimingMiddleware times a sampled share of requests (total, view, auth,
+database and serialization, see api.instrumentation), reports them in a
+``Server-Timing`` header and logs them as one JSON line on ``api.timing``.
+Unsampled requests pass straight through.
+
+ProfilerMiddleware runs requests that carry a valid profiling token under
+cProfile, see api.profiler.
+
+CompressionMiddleware: unlike django.middleware.gzip, output is
+deterministic (no random filename padding, zero mtime), so
+ConditionalGetMiddleware placed above this one hashes the compressed bytes
+into a strong ETag per encoding and can answer ``If-None-Match`` with 304.
+API bodies carry no secrets next to reflected input, so BREACH padding buys
+nothing here.
+
+Brotli is used when the ``brotli`` package is installed and the client
+accepts it, gzip otherwise. Streaming responses (the item export) are gzipped
+chunk by chunk.
+"""
+import gzip
+import json
+import logging
+import random
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import instrumentation, metrics, profiler
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+timing_logger = logging.getLogger('api.timing')
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with instrumentation.track() as stats:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            self.observe(request, response, stats, started)
+            return response
+
+    async def __acall__(self, request):
+        with instrumentation.track() as stats:
+            started = time.perf_counter()
+            response = await self.get_response(request)
+            self.observe(request, response, stats, started)
+            return response
+
+    def observe(self, request, response, stats, started):
+        # Route names, never raw paths, keep label cardinality bounded
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - started, stats)
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # A sync process_view would cost every request a thread hop
+            self.process_view = self._aprocess_view
+
+    def _sampled(self):
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        return rate > 0 and (rate >= 1 or random.random() < rate)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+        with instrumentation.track() as stats:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            return self.report(request, response, stats, started)
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+        with instrumentation.track() as stats:
+            started = time.perf_counter()
+            response = await self.get_response(request)
+            return self.report(request, response, stats, started)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if instrumentation.current() is not None:
+            request.view_started = time.perf_counter()
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.process_view(request, view_func, view_args, view_kwargs)
+
+    def report(self, request, response, stats, started):
+        finished = time.perf_counter()
+        view_started = getattr(request, 'view_started', None)
+        timings = {
+            'total': finished - started,
+            'view': finished - view_started if view_started is not None else None,
+            'auth': stats.auth_seconds,
+            'db': stats.query_seconds,
+            'serialize': stats.serialize_seconds,
+        }
+        metrics = [
+            f'{name};dur={seconds * 1000:.2f}' + (f';desc="{stats.queries} queries"' if name == 'db' else '')
+            for name, seconds in timings.items()
+            if seconds is not None
+        ]
+        response['Server-Timing'] = ', '.join(metrics)
+
+        match = request.resolver_match
+        timing_logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'route': match.view_name if match else None,
+            'status': response.status_code,
+            'user_type': getattr(request, 'user_type', None),
+            'db_queries': stats.queries,
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in timings.items() if seconds is not None},
+        }))
+        return response
+
+
+class ProfilerMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _requested(self, request):
+        token = request.headers.get(profiler.HEADER)
+        return bool(token) and profiler.token_allows(token, request.path)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self._requested(request) or not profiler.acquire():
+            return self.get_response(request)
+        try:
+            run = profiler.ProfileRun()
+            started = time.perf_counter()
+            thread_profiler = run.enable_here()
+            try:
+                response = self.get_response(request)
+            finally:
+                run.disable(thread_profiler)
+            name = profiler.save(run, request, response.status_code, time.perf_counter() - started)
+        finally:
+            profiler.release()
+        return self._tag(response, name)
+
+    async def __acall__(self, request):
+        if not self._requested(request) or not profiler.acquire():
+            return await self.get_response(request)
+        try:
+            run = profiler.ProfileRun()
+            started = time.perf_counter()
+            if profiler.PROCESS_WIDE:
+                # One profiler sees every thread anyway, see api.profiler
+                process_profiler = run.enable_here()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    run.disable(process_profiler)
+            else:
+                # Thread-sensitive calls of this request all run on one thread
+                thread_profiler = await sync_to_async(run.enable_here)()
+                try:
+                    response = await profiler.ProfiledCoroutine(self.get_response(request), run.new_profiler())
+                finally:
+                    await sync_to_async(run.disable)(thread_profiler)
+            name = await sync_to_async(profiler.save, thread_sensitive=False)(
+                run, request, response.status_code, time.perf_counter() - started
+            )
+        finally:
+            profiler.release()
+        return self._tag(response, name)
+
+    def _tag(self, response, name):
+        if name is not None:
+            response['X-Profile-Id'] = name
+            response['X-Profile-Scope'] = profiler.SCOPE
+        return response
+
+
+def _accepted_encodings(request):
+    """
+    Content codings from Accept-Encoding with a non-zero q-value.
+    """
+    accepted = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        params = params.strip()
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _agzip_stream(chunks):
+    compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = _accepted_encodings(request)
+
+        if response.streaming:
+            if 'gzip' not in accepted:
+                return response
+            if response.is_async:
+                response.streaming_content = _agzip_stream(response.streaming_content)
+            else:
+                response.streaming_content = _gzip_stream(response.streaming_content)
+            del response['Content-Length']
+            response['Content-Encoding'] = 'gzip'
+            return response
+
+        if brotli is not None and 'br' in accepted:
+            encoding = 'br'
+            compressed = brotli.compress(response.content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+        elif 'gzip' in accepted:
+            encoding = 'gzip'
+            compressed = gzip.compress(response.content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        # An ETag set by the view described the uncompressed bytes
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        return response
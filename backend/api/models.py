@@ -5,6 +5,8 @@ from django.utils import timezone
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.contrib.gis.db import models as gis_models
+from django.db.models.functions import Now
+from django.contrib.postgres.indexes import GistIndex
 
 class User(AbstractUser):
     USER_TYPE_CHOICES = (
@@ -29,6 +31,16 @@ class User(AbstractUser):
         help_text='Specific permissions for this user.'
     )
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Signup relies on this (and the username unique index) to reject duplicates
+            models.UniqueConstraint(
+                fields=['email'],
+                condition=~models.Q(email=''),
+                name='unique_user_email'
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.pk:
             if isinstance(self, Organization):
@@ -41,6 +53,8 @@ class Organization(User):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, parent_link=True)
     name = models.TextField()
     location = gis_models.PointField()
+    # Distance the organization can collect from; indexed in api.spatial_index
+    service_radius_km = models.FloatField(default=5)
     
     address_line1 = models.CharField(max_length=255, blank=True, null=True)
     address_line2 = models.CharField(max_length=255, blank=True, null=True)
@@ -54,6 +68,14 @@ class Samaritan(User):
     city = models.CharField(max_length=100, blank=True, null=True)
     province = models.CharField(max_length=2, blank=True, null=True)
 
+# Items an organization can still claim; shared by the listing queries and
+# the partial indexes below so the planner can match them.
+ITEM_AVAILABLE = models.Q(
+    reserved_by__isnull=True,
+    is_picked_up=False,
+    reserved_till__isnull=True
+)
+
 class Item(models.Model):
     CATEGORY_CHOICES = [
         (0, 'Food'),
@@ -75,7 +97,9 @@ class Item(models.Model):
     volume = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     volume_unit = models.CharField(max_length=50, blank=True, null=True)
     best_before = models.DateField(blank=True, null=True)
-    pickup_location = gis_models.PointField()
+    # Stored as geography so radius filters (ST_DWithin) and KNN ordering (<->)
+    # work in metres against its GiST indexes (see Meta.indexes).
+    pickup_location = gis_models.PointField(geography=True)
     reserved_till = models.DateTimeField(blank=True, null=True)
     posted_by = models.ForeignKey(
         Samaritan,
@@ -90,4 +114,77 @@ class Item(models.Model):
         related_name="reserved_items"
     )
     pickup_time = models.DateTimeField(blank=True, null=True)
-    is_picked_up = models.BooleanField(default=False)
\ No newline at end of file
+    is_picked_up = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Change marker for /listings/changes. Raw UPDATEs (api.reservations) set
+    # it explicitly; db_default covers fixtures, which bypass auto_now.
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now(), db_index=True)
+
+    class Meta:
+        indexes = [
+            GistIndex(
+                fields=['pickup_location'],
+                condition=ITEM_AVAILABLE,
+                name='item_available_location_gist'
+            ),
+            models.Index(
+                fields=['category', 'id'],
+                condition=ITEM_AVAILABLE,
+                name='item_available_category_idx'
+            ),
+            # Perishables still on offer, for hiding and archiving expired food
+            models.Index(
+                fields=['best_before'],
+                condition=ITEM_AVAILABLE & models.Q(best_before__isnull=False),
+                name='item_available_best_before_idx'
+            ),
+            # Outstanding holds only, for the reservation expiry sweeper
+            models.Index(
+                fields=['reserved_till'],
+                condition=models.Q(reserved_till__isnull=False, is_picked_up=False),
+                name='item_reserved_till_idx'
+            ),
+            # Picked-up items, for archiving them by age (api.archive); rows
+            # without a pickup_time are aged by updated_at instead
+            models.Index(
+                fields=['pickup_time'],
+                condition=models.Q(is_picked_up=True),
+                name='item_picked_up_time_idx'
+            ),
+            models.Index(
+                fields=['updated_at'],
+                condition=models.Q(is_picked_up=True, pickup_time__isnull=True),
+                name='item_picked_up_untimed_idx'
+            ),
+        ]
+
+class ArchivedItem(models.Model):
+    """
+    Expired or long picked-up items moved out of the hot Item table by the
+    archive_items command. Columns mirror Item one for one (ids included);
+    the poster and reserver are kept as plain ids so history survives them.
+    """
+    ARCHIVE_REASON_CHOICES = (
+        ('expired', 'Expired'),
+        ('picked_up', 'Picked up'),
+    )
+
+    id = models.BigIntegerField(primary_key=True)
+    category = models.IntegerField(choices=Item.CATEGORY_CHOICES)
+    description = models.TextField()
+    weight = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    weight_unit = models.CharField(max_length=50, blank=True, null=True)
+    volume = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    volume_unit = models.CharField(max_length=50, blank=True, null=True)
+    best_before = models.DateField(blank=True, null=True)
+    pickup_location = gis_models.PointField(geography=True, spatial_index=False)
+    reserved_till = models.DateTimeField(blank=True, null=True)
+    posted_by_id = models.BigIntegerField()
+    reserved_by_id = models.BigIntegerField(blank=True, null=True)
+    pickup_time = models.DateTimeField(blank=True, null=True)
+    is_picked_up = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    archived_at = models.DateTimeField(db_index=True)
+    archive_reason = models.CharField(max_length=20, choices=ARCHIVE_REASON_CHOICES)
@@ -0,0 +1,184 @@
+"""
+On-demand cProfile capture of individual requests.
+
+A request is profiled when it carries an ``X-Profile-Request`` header holding
+a token minted by ``manage.py profiles token`` (signed with SECRET_KEY, so
+only people with server access can create one, and expiring). The resulting
+pstats files go to PROFILER_DIR, which is kept to the newest
+PROFILER_MAX_FILES as a ring buffer; ``manage.py profiles list|dump`` reads
+them back. The files load in pstats, snakeviz, gprof2dot or flameprof.
+
+Only one request per process is profiled at a time; concurrent candidates
+are served normally. Under ASGI both the event loop steps of the request and
+its thread-sensitive sync thread (ORM calls) are captured, see ProfileRun.
+
+From Python 3.12 (the Docker image) cProfile is built on sys.monitoring,
+which is interpreter-wide: an enabled profiler records every thread and
+coroutine of the worker, not just the profiled request. There a single
+profiler simply runs for the duration of the request, and the profile is
+marked shared (``_shared`` in the file name, ``X-Profile-Scope: process`` on
+the response) since it includes whatever else the worker did meanwhile.
+"""
+import cProfile
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+
+HEADER = 'X-Profile-Request'
+SALT = 'api.profiler'
+
+# cProfile on sys.monitoring cannot be limited to one thread or coroutine
+PROCESS_WIDE = sys.version_info >= (3, 12)
+SCOPE = 'process' if PROCESS_WIDE else 'request'
+
+_busy = threading.Lock()
+
+
+def make_token(ttl_seconds, path_prefix=None):
+    """
+    Token allowing requests under path_prefix (any path if None) to be
+    profiled for the next ttl_seconds.
+    """
+    return signing.dumps({'exp': time.time() + ttl_seconds, 'path': path_prefix}, salt=SALT)
+
+
+def token_allows(token, path):
+    try:
+        claims = signing.loads(token, salt=SALT)
+    except signing.BadSignature:
+        return False
+    if claims.get('exp', 0) < time.time():
+        return False
+    return claims.get('path') is None or path.startswith(claims['path'])
+
+
+def acquire():
+    """
+    Claim this process's single profiling slot; False if it is taken.
+    """
+    return _busy.acquire(blocking=False)
+
+
+def release():
+    _busy.release()
+
+
+class ProfileRun:
+    """
+    cProfile profilers for one request. Before Python 3.12 each profiler
+    only sees the thread it was enabled on, so the loop-thread one is switched
+    on around each step of the request's coroutine (keeping other requests on
+    the loop out) and a second one runs on the request's sync thread. With
+    PROCESS_WIDE only one profiler is used, see the module docstring.
+    """
+    def __init__(self):
+        self.profilers = []
+
+    def new_profiler(self):
+        profiler = cProfile.Profile()
+        self.profilers.append(profiler)
+        return profiler
+
+    def enable_here(self):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Interpreter-wide profiling (sys.monitoring) is already on
+            return None
+        self.profilers.append(profiler)
+        return profiler
+
+    def disable(self, profiler):
+        if profiler is not None:
+            profiler.disable()
+
+    def stats(self):
+        stats = None
+        for profiler in self.profilers:
+            profiler.create_stats()
+            if not profiler.stats:
+                continue
+            if stats is None:
+                stats = pstats.Stats(profiler)
+            else:
+                stats.add(profiler)
+        return stats
+
+
+class ProfiledCoroutine:
+    """
+    Await coro with profiler enabled only while it is actually running.
+    """
+    def __init__(self, coro, profiler):
+        self.coro = coro
+        self.profiler = profiler
+
+    def _enable(self):
+        try:
+            self.profiler.enable()
+            return True
+        except ValueError:
+            # Another profiler already covers the whole interpreter
+            return False
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            enabled = self._enable()
+            try:
+                if error is not None:
+                    future = self.coro.throw(error)
+                else:
+                    future = self.coro.send(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                if enabled:
+                    self.profiler.disable()
+            try:
+                value, error = (yield future), None
+            except BaseException as e:
+                value, error = None, e
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '-', value).strip('-')[:60] or 'root'
+
+
+def save(run, request, status, seconds):
+    """
+    Write the profile of a finished request and trim the ring buffer.
+    Returns the file name, or None if nothing was captured.
+    """
+    stats = run.stats()
+    if stats is None:
+        return None
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    shared = '_shared' if PROCESS_WIDE else ''
+    name = f'{time.time_ns()}_{request.method}_{_slug(request.path)}_{status}_{seconds * 1000:.0f}ms{shared}.prof'
+    stats.dump_stats(os.path.join(settings.PROFILER_DIR, name))
+
+    for old in list_profiles()[:-settings.PROFILER_MAX_FILES or None]:
+        try:
+            os.remove(os.path.join(settings.PROFILER_DIR, old))
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def list_profiles():
+    """
+    Stored profile file names, oldest first.
+    """
+    try:
+        names = os.listdir(settings.PROFILER_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names if name.endswith('.prof'))
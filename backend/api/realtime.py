@@ -0,0 +1,398 @@
+"""
+Push notifications of new donations to organizations over WebSocket.
+
+Organizations connect to ``/ws/listings/`` (routed from djangotango.asgi),
+authenticate with the same JWT as the REST API (cookie or ``?token=``) and
+send ``{"type": "subscribe", "radius": <km>, "categories": [...]}``. Without
+a radius the subscription follows the organization's service area
+(``service_radius_km``), looked up in api.spatial_index.organization_index.
+Every item created by the donate endpoints is published to the broker, which
+only delivers it to subscriptions whose area contains the pickup point.
+
+The broker is chosen with the REALTIME_BROKER setting. InProcessBroker is
+enough for a single worker process; PostgresNotifyBroker relays events
+through LISTEN/NOTIFY so every worker and node sees every donation.
+"""
+import asyncio
+import itertools
+import json
+import select
+import threading
+import time
+from urllib.parse import parse_qs
+
+import psycopg2
+from django.conf import settings
+from django.db import connection
+from django.http.cookie import parse_cookie
+from django.utils.module_loading import import_string
+
+from .jwt import AUTH_ERRORS, aauthenticate_token
+from .models import Item
+from .spatial_index import CircleGridIndex, distance_m, organization_index
+
+CATEGORY_NAMES = dict(Item.CATEGORY_CHOICES)
+
+
+class Subscription:
+    """
+    One connected organization: where it is, what it wants (radius_m None
+    means its service area), and the queue of its socket. Delivery is
+    thread-safe and never blocks the publisher; a client too slow to drain its
+    queue loses events rather than stalling others.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, organization_id, longitude, latitude, radius_m, categories, loop, queue):
+        self.id = next(self._ids)
+        self.organization_id = organization_id
+        self.longitude = longitude
+        self.latitude = latitude
+        self.radius_m = radius_m
+        self.categories = categories
+        self.loop = loop
+        self.queue = queue
+
+    def wants(self, event):
+        return not self.categories or event['category']['id'] in self.categories
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+
+class InProcessBroker:
+    """
+    Fans events out to the subscriptions of this process only. Those with
+    their own radius are found through a CircleGridIndex of their areas, those
+    following a service area through the organization index.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = CircleGridIndex(settings.ORGANIZATION_INDEX_CELL_DEGREES)
+        # organization id -> {subscription id: subscription}
+        self._service_area_subscriptions = {}
+
+    def subscribe(self, subscription):
+        if subscription.radius_m is None:
+            with self._lock:
+                self._service_area_subscriptions.setdefault(
+                    subscription.organization_id, {}
+                )[subscription.id] = subscription
+            return
+        self._subscriptions.insert(
+            subscription.id, subscription.longitude, subscription.latitude,
+            subscription.radius_m, subscription
+        )
+
+    def unsubscribe(self, subscription):
+        if subscription.radius_m is None:
+            with self._lock:
+                subscriptions = self._service_area_subscriptions.get(subscription.organization_id)
+                if subscriptions is not None:
+                    subscriptions.pop(subscription.id, None)
+                    if not subscriptions:
+                        del self._service_area_subscriptions[subscription.organization_id]
+            return
+        self._subscriptions.remove(subscription.id)
+
+    def publish(self, events):
+        self.dispatch(events)
+
+    def publish_organization_change(self, change):
+        organization_index.apply(*change)
+
+    def _matching(self, longitude, latitude):
+        subscriptions = [subscription for _, subscription, _ in self._subscriptions.covering(longitude, latitude)]
+        if self._service_area_subscriptions:
+            organization_ids = organization_index.organizations_covering(longitude, latitude)
+            with self._lock:
+                for organization_id in organization_ids:
+                    subscriptions.extend(self._service_area_subscriptions.get(organization_id, {}).values())
+        return subscriptions
+
+    def dispatch(self, events):
+        for event in events:
+            location = event['pickup_location']
+            for subscription in self._matching(location['longitude'], location['latitude']):
+                if subscription.wants(event):
+                    subscription.deliver(event)
+
+
+class PostgresNotifyBroker(InProcessBroker):
+    """
+    Publishes with pg_notify and dispatches whatever arrives on the channel
+    (including its own events) to local subscriptions, so subscribers on any
+    worker or node receive every donation. Organization index changes travel
+    the same way on a second channel. The LISTEN connection runs on a daemon
+    thread started with the first subscription; until then this worker's
+    index is not consulted, and it is reloaded whenever listening (re)starts
+    so no change in between is lost.
+    """
+    channel = 'item_events'
+    organization_channel = 'organization_events'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, subscription):
+        super().subscribe(subscription)
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='realtime-listener', daemon=True)
+                self._listener.start()
+
+    def publish(self, events):
+        # One notification per event (payloads are capped at 8000 bytes), all
+        # sent in a single statement so a batch donation costs one round trip
+        if not events:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload',
+                [self.channel, [json.dumps(event) for event in events]]
+            )
+
+    def publish_organization_change(self, change):
+        # Applied here right away; the notification reaches the other workers
+        organization_index.apply(*change)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.organization_channel, json.dumps(change)])
+
+    def _listen(self):
+        while True:
+            listen_connection = None
+            try:
+                listen_connection = psycopg2.connect(**connection.get_connection_params())
+                listen_connection.set_session(autocommit=True)
+                with listen_connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN {self.channel}')
+                    cursor.execute(f'LISTEN {self.organization_channel}')
+                # Changes broadcast while nobody listened are only in the database
+                organization_index.load()
+                connection.close()
+                while True:
+                    if select.select([listen_connection], [], [], 60) == ([], [], []):
+                        continue
+                    listen_connection.poll()
+                    events = []
+                    while listen_connection.notifies:
+                        notify = listen_connection.notifies.pop(0)
+                        if notify.channel == self.organization_channel:
+                            organization_index.apply(*json.loads(notify.payload))
+                        else:
+                            events.append(json.loads(notify.payload))
+                    self.dispatch(events)
+            except Exception as e:
+                print(f"Realtime listener error: {str(e)}")
+                if listen_connection is not None:
+                    listen_connection.close()
+                time.sleep(5)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.REALTIME_BROKER)()
+        return _broker
+
+
+def item_event(item, poster):
+    """
+    The event published for a newly donated item; shaped like a listing
+    entry without distance_km, which is added per subscriber.
+    """
+    event = {
+        'id': item.id,
+        'category': {
+            'id': item.category,
+            'name': CATEGORY_NAMES[item.category]
+        },
+        'description': item.description[:settings.REALTIME_DESCRIPTION_LENGTH],
+        'pickup_location': {
+            'latitude': item.pickup_location.y,
+            'longitude': item.pickup_location.x
+        },
+        'posted_by': {
+            'id': poster.pk,
+            'username': poster.username
+        }
+    }
+    if item.weight is not None:
+        event['weight'] = {'value': float(item.weight), 'unit': item.weight_unit}
+    if item.volume is not None:
+        event['volume'] = {'value': float(item.volume), 'unit': item.volume_unit}
+    if item.best_before is not None:
+        event['best_before'] = item.best_before.isoformat()
+    return event
+
+
+def publish_items(items, poster):
+    """
+    Announce newly created items. Publishing never fails the caller.
+    """
+    try:
+        get_broker().publish([item_event(item, poster) for item in items])
+    except Exception as e:
+        print(f"Realtime publish error: {str(e)}")
+
+
+def publish_organization_change(change):
+    """
+    Apply an organization_change to the index of every worker. Never fails
+    the caller; the periodic reload catches up on anything lost.
+    """
+    try:
+        get_broker().publish_organization_change(change)
+    except Exception as e:
+        print(f"Organization change publish error: {str(e)}")
+
+
+def _scope_token(scope):
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    if query.get('token'):
+        return query['token'][0]
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            return parse_cookie(value.decode('latin-1')).get('jwt')
+    return None
+
+
+def _subscription_from_message(message, organization, loop, queue):
+    """
+    Build a Subscription from a subscribe message.
+    Returns (subscription, error_message).
+    """
+    radius_km = message.get('radius')
+    if isinstance(radius_km, bool):
+        return None, "Invalid radius or categories"
+    try:
+        radius_km = float(radius_km) if radius_km is not None else None
+    except (ValueError, TypeError):
+        return None, "Invalid radius or categories"
+    # A real list of ints; iterating a string, dict or bool would invent categories
+    categories = message.get('categories') or []
+    if not isinstance(categories, list) or not all(
+        isinstance(category, int) and not isinstance(category, bool) for category in categories
+    ):
+        return None, "Invalid radius or categories"
+    categories = set(categories)
+    if radius_km is not None and not 0 < radius_km <= settings.REALTIME_MAX_RADIUS_KM:
+        return None, f"Radius must be between 0 and {settings.REALTIME_MAX_RADIUS_KM} km"
+    if not categories.issubset(CATEGORY_NAMES):
+        return None, "Invalid category"
+
+    location = organization.location
+    radius_m = radius_km * 1000 if radius_km is not None else None
+    return Subscription(
+        organization.pk, location.x, location.y, radius_m, categories, loop, queue
+    ), None
+
+
+async def websocket_application(scope, receive, send):
+    """
+    ASGI application for ``/ws/listings/``.
+    """
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    if scope['path'].rstrip('/') != '/ws/listings':
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+
+    token = _scope_token(scope)
+    try:
+        if not token:
+            raise KeyError('token')
+        payload, organization = await aauthenticate_token(token)
+    except AUTH_ERRORS:
+        await send({'type': 'websocket.close', 'code': 4401})
+        return
+    if payload['user_type'] != 'organization' or not organization.location:
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+
+    await send({'type': 'websocket.accept'})
+
+    async def send_json(data):
+        await send({'type': 'websocket.send', 'text': json.dumps(data)})
+
+    broker = get_broker()
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE)
+    subscription = None
+    receiving = asyncio.ensure_future(receive())
+    delivering = asyncio.ensure_future(queue.get())
+    try:
+        while True:
+            done, _ = await asyncio.wait({receiving, delivering}, return_when=asyncio.FIRST_COMPLETED)
+
+            if delivering in done:
+                event = delivering.result()
+                # Events queued before an unsubscribe are dropped
+                if subscription is not None:
+                    location = event['pickup_location']
+                    distance = distance_m(
+                        subscription.longitude, subscription.latitude,
+                        location['longitude'], location['latitude']
+                    )
+                    await send_json({'type': 'item', 'item': {**event, 'distance_km': round(distance / 1000, 2)}})
+                delivering = asyncio.ensure_future(queue.get())
+
+            if receiving in done:
+                message = receiving.result()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                receiving = asyncio.ensure_future(receive())
+
+                try:
+                    data = json.loads(message.get('text') or message.get('bytes') or '')
+                except ValueError:
+                    # JSONDecodeError, or UnicodeDecodeError for a binary frame
+                    # that is not UTF-8
+                    await send_json({'type': 'error', 'error': 'Invalid JSON format'})
+                    continue
+                if not isinstance(data, dict):
+                    await send_json({'type': 'error', 'error': 'Expected a JSON object'})
+                    continue
+
+                if data.get('type') == 'subscribe':
+                    new_subscription, error = _subscription_from_message(data, organization, loop, queue)
+                    if error:
+                        await send_json({'type': 'error', 'error': error})
+                        continue
+                    if subscription is not None:
+                        broker.unsubscribe(subscription)
+                    subscription = new_subscription
+                    broker.subscribe(subscription)
+                    await send_json({
+                        'type': 'subscribed',
+                        # null: following the organization's service area
+                        'radius': subscription.radius_m / 1000 if subscription.radius_m is not None else None,
+                        'categories': sorted(subscription.categories)
+                    })
+                elif data.get('type') == 'unsubscribe':
+                    if subscription is not None:
+                        broker.unsubscribe(subscription)
+                        subscription = None
+                    await send_json({'type': 'unsubscribed'})
+                elif data.get('type') == 'ping':
+                    await send_json({'type': 'pong'})
+                else:
+                    await send_json({'type': 'error', 'error': 'Unknown message type'})
+    finally:
+        receiving.cancel()
+        delivering.cancel()
+        if subscription is not None:
+            broker.unsubscribe(subscription)
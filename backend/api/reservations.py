@@ -0,0 +1,105 @@
+"""
+Atomic bulk reservation of items by organizations.
+
+Candidates are selected with ``FOR UPDATE SKIP LOCKED`` inside the same
+``UPDATE ... RETURNING`` that claims them, so one statement (one round trip)
+reserves every item that is still free and silently passes over rows another
+organization is claiming at that moment. Competing organizations can never
+double-reserve and never block or retry on each other.
+
+Expired holds are released the same way, in bounded batches, by
+release_expired (see the release_expired_reservations command).
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .listings import available_items, nearby_items
+from .models import Item
+
+
+def update_locked_sql(candidates, reserved_by_id, reserved_till):
+    """
+    The UPDATE ... RETURNING statement claiming the rows selected by
+    candidates, a select_for_update(skip_locked=True) queryset of primary keys.
+    Returns (sql, params).
+    """
+    quote = connection.ops.quote_name
+    sql, params = candidates.query.sql_with_params()
+    return (
+        f"UPDATE {quote(Item._meta.db_table)} "
+        f"SET {quote('reserved_by_id')} = %s, {quote('reserved_till')} = %s, "
+        f"{quote('updated_at')} = %s "
+        f"WHERE {quote('id')} IN ({sql}) "
+        f"RETURNING {quote('id')}, "
+        f"ST_X({quote('pickup_location')}::geometry), ST_Y({quote('pickup_location')}::geometry)",
+        [reserved_by_id, reserved_till, timezone.now(), *params]
+    )
+
+
+def _update_locked(candidates, reserved_by_id, reserved_till):
+    """
+    Set reserved_by/reserved_till (and bump updated_at) on the rows selected
+    by candidates, see update_locked_sql.
+    Returns a list of (item_id, longitude, latitude) for the updated items.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(*update_locked_sql(candidates, reserved_by_id, reserved_till))
+            return cursor.fetchall()
+
+
+def id_candidates(item_ids):
+    """
+    Lockable primary keys of whichever of item_ids are still available.
+    """
+    candidates = available_items().filter(pk__in=item_ids).order_by('pk')
+    return candidates.select_for_update(skip_locked=True).values('pk')
+
+
+def nearest_candidates(location, count, radius_m, category):
+    """
+    Lockable primary keys of up to count available items nearest to location.
+    """
+    candidates = nearby_items(location, radius_m, category)
+    return candidates.select_for_update(skip_locked=True).values('pk')[:count]
+
+
+def expired_candidates(batch_size):
+    """
+    Lockable primary keys of up to batch_size reservations whose hold has
+    run out and that were never picked up, oldest first.
+    """
+    candidates = Item.objects.filter(
+        reserved_till__lt=timezone.now(),
+        is_picked_up=False
+    ).order_by('reserved_till')
+    return candidates.select_for_update(skip_locked=True).values('pk')[:batch_size]
+
+
+def reserve_by_ids(organization, item_ids, hold):
+    """
+    Reserve whichever of item_ids are still available.
+    Returns (reserved_till, claimed rows as in _update_locked).
+    """
+    reserved_till = timezone.now() + hold
+    candidates = id_candidates(item_ids)
+    return reserved_till, _update_locked(candidates, organization.pk, reserved_till)
+
+
+def reserve_nearest(organization, count, radius_m, category, hold):
+    """
+    Reserve up to count available items nearest to the organization.
+    Returns (reserved_till, claimed rows as in _update_locked).
+    """
+    reserved_till = timezone.now() + hold
+    candidates = nearest_candidates(organization.location, count, radius_m, category)
+    return reserved_till, _update_locked(candidates, organization.pk, reserved_till)
+
+
+def release_expired(batch_size):
+    """
+    Release up to batch_size reservations whose hold has run out and that
+    were never picked up, oldest first.
+    Returns the released rows as in _update_locked.
+    """
+    return _update_locked(expired_candidates(batch_size), None, None)
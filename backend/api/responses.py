@@ -0,0 +1,72 @@
+"""
+Fast JSON responses for the hot endpoints.
+
+FastJsonResponse is a drop-in for JsonResponse that encodes with orjson when
+it is installed (and JSON_RESPONSE_BACKEND allows it), falling back to the
+stdlib encoder otherwise. Both backends produce the same document: Decimal
+becomes a number, date/datetime ISO 8601 strings and GEOS points
+``{"latitude", "longitude"}`` objects, as in the listing serializers.
+"""
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.http import HttpResponse
+
+from .instrumentation import measure
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Point):
+        return {'latitude': value.y, 'longitude': value.x}
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _orjson_dumps(data):
+    # Category maps are keyed by int, which the stdlib encoder stringifies
+    return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _stdlib_dumps(data):
+    return json.dumps(data, default=_default, separators=(',', ':')).encode()
+
+
+def get_backend():
+    """
+    Name of the encoder in use: 'orjson' or 'stdlib'.
+    """
+    if settings.JSON_RESPONSE_BACKEND == 'stdlib' or orjson is None:
+        return 'stdlib'
+    return 'orjson'
+
+
+BACKENDS = {'orjson': _orjson_dumps, 'stdlib': _stdlib_dumps}
+
+
+def dumps(data):
+    """
+    Encode data to JSON bytes with the configured backend.
+    """
+    with measure('serialize_seconds'):
+        return BACKENDS[get_backend()](data)
+
+
+class FastJsonResponse(HttpResponse):
+    """
+    JsonResponse replacement; content may be passed pre-encoded as bytes
+    (e.g. from a cache) via body= instead of data.
+    """
+    def __init__(self, data=None, body=None, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=body if body is not None else dumps(data), **kwargs)
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import realtime
+from .models import Organization
+from .spatial_index import organization_change
+
+
+# Broadcast only once committed, so no worker indexes a rolled back change
+@receiver(post_save, sender=Organization)
+def index_organization(sender, instance, **kwargs):
+    change = organization_change(instance)
+    transaction.on_commit(lambda: realtime.publish_organization_change(change))
+
+
+@receiver(post_delete, sender=Organization)
+def unindex_organization(sender, instance, **kwargs):
+    change = (instance.pk, None, None, None)
+    transaction.on_commit(lambda: realtime.publish_organization_change(change))
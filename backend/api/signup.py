@@ -0,0 +1,57 @@
+"""
+Account creation for the signup views.
+
+The password is hashed before anything touches the database, and the user
+and profile rows are written by a single save inside one transaction: one
+INSERT per table, no plaintext password ever stored. Duplicate usernames and
+emails are detected from the unique constraints instead of pre-queries, so
+concurrent signups cannot race past the check.
+"""
+from django.db import IntegrityError, transaction
+
+from . import hashing
+
+
+class SignupConflict(Exception):
+    pass
+
+
+_CONFLICT_MESSAGES = (
+    ('email', "A user with this email already exists"),
+    ('username', "A user with this username already exists"),
+)
+
+
+def _conflict_message(error):
+    diag = getattr(error.__cause__, 'diag', None)
+    constraint = getattr(diag, 'constraint_name', None) or str(error)
+    for field, message in _CONFLICT_MESSAGES:
+        if field in constraint:
+            return message
+    return None
+
+
+def create_account(model, username, email, password, **profile_fields):
+    """
+    Create an Organization or Samaritan together with its User row.
+    Returns the saved instance, raises SignupConflict on a duplicate
+    username or email and HashingPoolSaturated if hashing is overloaded.
+    """
+    account = model(
+        username=username,
+        email=email,
+        password=hashing.make_password(password),
+        is_staff=False,
+        **profile_fields
+    )
+    try:
+        with transaction.atomic():
+            # force_insert skips the UPDATE probe Django would otherwise try
+            # for the child row, whose primary key comes from the parent
+            account.save(force_insert=True)
+    except IntegrityError as e:
+        message = _conflict_message(e)
+        if message is None:
+            raise
+        raise SignupConflict(message)
+    return account
@@ -0,0 +1,218 @@
+"""
+In-memory spatial index answering "whose circle covers this point?".
+
+Circles (a centre plus a radius in metres) are registered in every cell of a
+regular lat/lon grid that their bounding box touches, so a point lookup only
+has to check the handful of circles registered in its own cell. Used for the
+organization service areas below, which route donations to the
+organizations they fall in (see api.realtime), and for WebSocket
+subscriptions with their own radius.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Organization
+
+EARTH_RADIUS_M = 6371008.8
+M_PER_DEGREE = 111320.0
+
+
+def distance_m(longitude1, latitude1, longitude2, latitude2):
+    """
+    Great-circle (haversine) distance in metres.
+    """
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class CircleGridIndex:
+    """
+    Thread-safe grid index of circles keyed by an arbitrary hashable key.
+    """
+    def __init__(self, cell_degrees):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._cells = {}
+        self._circles = {}
+
+    def _cell(self, longitude, latitude):
+        return math.floor(longitude / self.cell_degrees), math.floor(latitude / self.cell_degrees)
+
+    def _cells_for(self, longitude, latitude, radius_m):
+        lat_delta = radius_m / M_PER_DEGREE
+        lon_delta = radius_m / (M_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+        min_col, min_row = self._cell(longitude - lon_delta, latitude - lat_delta)
+        max_col, max_row = self._cell(longitude + lon_delta, latitude + lat_delta)
+        return [
+            (col, row)
+            for col in range(min_col, max_col + 1)
+            for row in range(min_row, max_row + 1)
+        ]
+
+    def __len__(self):
+        return len(self._circles)
+
+    def insert(self, key, longitude, latitude, radius_m, value=None):
+        """
+        Add or replace the circle stored under key.
+        """
+        with self._lock:
+            self._insert(key, longitude, latitude, radius_m, value)
+
+    def _insert(self, key, longitude, latitude, radius_m, value=None):
+        cells = self._cells_for(longitude, latitude, radius_m)
+        self._remove(key)
+        self._circles[key] = (longitude, latitude, radius_m, value, cells)
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        circle = self._circles.pop(key, None)
+        if circle is None:
+            return
+        for cell in circle[4]:
+            keys = self._cells.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._circles.clear()
+
+    def covering(self, longitude, latitude):
+        """
+        (key, value, distance_m) for every circle containing the point.
+        """
+        with self._lock:
+            candidates = [
+                (key, self._circles[key])
+                for key in self._cells.get(self._cell(longitude, latitude), ())
+            ]
+        matches = []
+        for key, (center_lon, center_lat, radius_m, value, _) in candidates:
+            distance = distance_m(center_lon, center_lat, longitude, latitude)
+            if distance <= radius_m:
+                matches.append((key, value, distance))
+        return matches
+
+
+def organization_change(organization):
+    """
+    Index change for an organization as saved: (id, longitude, latitude,
+    radius_m), with None coordinates if it has no location.
+    """
+    location = organization.location
+    if location is None:
+        return organization.pk, None, None, None
+    return organization.pk, location.x, location.y, organization.service_radius_km * 1000
+
+
+class OrganizationIndex(CircleGridIndex):
+    """
+    Service areas of all organizations, keyed by organization id. start()
+    loads it on a daemon thread and reloads it every
+    ORGANIZATION_INDEX_REFRESH_SECONDS; a lookup before the first load has
+    finished waits for it. In between, changes committed by any worker are
+    applied through apply() (see api.signals and api.realtime).
+    """
+    def __init__(self, cell_degrees, refresh_seconds):
+        super().__init__(cell_degrees)
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at = None
+        self._refresher = None
+        self._start_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Changes applied while a reload is querying, replayed onto its result
+        self._pending = None
+
+    def load(self):
+        with self._load_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                rows = Organization.objects.values_list('pk', 'location', 'service_radius_km')
+                fresh = CircleGridIndex(self.cell_degrees)
+                for organization_id, location, radius_km in rows.iterator(chunk_size=2000):
+                    if location is not None:
+                        fresh.insert(organization_id, location.x, location.y, radius_km * 1000)
+                with self._lock:
+                    self._cells, self._circles = fresh._cells, fresh._circles
+                    for change in self._pending:
+                        self._apply(*change)
+                self.loaded_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._pending = None
+
+    def _ensure_loaded(self):
+        if self.loaded_at is not None:
+            return
+        with self._load_lock:
+            loaded = self.loaded_at is not None
+        if not loaded:
+            self.load()
+
+    def _refresh_forever(self):
+        while True:
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Organization index refresh error: {str(e)}")
+            finally:
+                # Don't hold a connection open between refreshes
+                connection.close()
+            time.sleep(self.refresh_seconds)
+
+    def start(self):
+        """
+        Start the background loader, once per process.
+        """
+        with self._start_lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(
+                    target=self._refresh_forever, name='organization-index', daemon=True
+                )
+                self._refresher.start()
+
+    def apply(self, organization_id, longitude, latitude, radius_m):
+        """
+        Apply a change from organization_change, also to a reload in progress.
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((organization_id, longitude, latitude, radius_m))
+            self._apply(organization_id, longitude, latitude, radius_m)
+
+    def _apply(self, organization_id, longitude, latitude, radius_m):
+        if longitude is None:
+            self._remove(organization_id)
+        else:
+            self._insert(organization_id, longitude, latitude, radius_m)
+
+    def organizations_covering(self, longitude, latitude):
+        """
+        Ids of the organizations whose service area contains the point.
+        """
+        self.start()
+        self._ensure_loaded()
+        return [key for key, _, _ in self.covering(longitude, latitude)]
+
+
+organization_index = OrganizationIndex(
+    settings.ORGANIZATION_INDEX_CELL_DEGREES,
+    settings.ORGANIZATION_INDEX_REFRESH_SECONDS
+)
@@ -1,3 +1,251 @@
-from django.test import TestCase
+"""
+Query-plan regression tests for the spatial listing, donate and reservation
+queries.
 
-# Create your tests here.
+A realistic dataset is seeded with create_dummy_data (city distribution,
+PLAN_TEST_ITEMS items, ANALYZEd) and the queries behind the hot endpoints are
+run through EXPLAIN (ANALYZE, FORMAT JSON) to check that they keep using their
+indexes, that the planner's row estimates stay close to reality and that each
+endpoint stays within its query budget. They need a PostGIS server, e.g. the
+compose one:
+
+    docker compose up -d postgres
+    POSTGRES_HOST=localhost python manage.py test api
+"""
+import io
+import json
+import os
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase
+from django.utils import timezone
+
+from . import instrumentation
+from .management.commands.release_expired_reservations import Command as ReleaseExpiredCommand
+from .jwt import generate_jwt_token
+from .listings import estimate_count, nearby_items, project
+from .models import Item, Organization, Samaritan
+from .reservations import expired_candidates, id_candidates, nearest_candidates, update_locked_sql
+
+PLAN_TEST_ITEMS = int(os.getenv('PLAN_TEST_ITEMS', 50000))
+# How far the planner's row estimate may be from the actual count, either way
+ROW_ESTIMATE_FACTOR = float(os.getenv('PLAN_TEST_ROW_ESTIMATE_FACTOR', 4))
+
+ITEM_TABLE = Item._meta.db_table
+LOCATION_INDEX = 'item_available_location_gist'
+RADIUS_M = 5000
+
+
+def explain(sql, params):
+    """
+    Run sql under EXPLAIN (ANALYZE, FORMAT JSON).
+    Returns the root plan node.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def explain_queryset(queryset):
+    return explain(*queryset.query.sql_with_params())
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def table_scans(plan, table=ITEM_TABLE):
+    return [node for node in plan_nodes(plan) if node.get('Relation Name') == table]
+
+
+def auth_headers(account):
+    token = generate_jwt_token({
+        'user_id': account.pk,
+        'username': account.username,
+        'email': account.email,
+        'is_staff': account.is_staff,
+        'user_type': account.user_type,
+    })
+    return {'Authorization': f'Bearer {token}'}
+
+
+class PlanAssertions:
+    def assertUsesIndex(self, plan, index_name):
+        used = {node.get('Index Name') for node in plan_nodes(plan)}
+        self.assertIn(index_name, used, f'{index_name} not used:\n{json.dumps(plan, indent=2)}')
+
+    def assertNoSeqScan(self, plan, table=ITEM_TABLE):
+        seq_scans = [node for node in table_scans(plan, table) if node['Node Type'] == 'Seq Scan']
+        self.assertFalse(seq_scans, f'Sequential scan on {table}:\n{json.dumps(plan, indent=2)}')
+
+    def assertRowsExamined(self, plan, limit, table=ITEM_TABLE):
+        """
+        The scans of table read at most limit rows, filtered ones included.
+        """
+        examined = sum(
+            (node['Actual Rows'] + node.get('Rows Removed by Filter', 0)) * node['Actual Loops']
+            for node in table_scans(plan, table)
+        )
+        self.assertLessEqual(examined, limit, f'{table} rows examined:\n{json.dumps(plan, indent=2)}')
+
+    def assertEstimateClose(self, estimated, actual):
+        estimated, actual = max(estimated, 1), max(actual, 1)
+        self.assertLessEqual(
+            max(estimated / actual, actual / estimated), ROW_ESTIMATE_FACTOR,
+            f'Planner estimated {estimated} rows, query returned {actual}'
+        )
+
+
+class SeededDataTestCase(PlanAssertions, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'create_dummy_data', users=500, orgs=50, items=PLAN_TEST_ITEMS, distribution='city',
+            seed=7, credentials='', stdout=io.StringIO()
+        )
+        cls.organization = Organization.objects.order_by('pk').first()
+        cls.samaritan = Samaritan.objects.order_by('pk').first()
+
+    def setUp(self):
+        caches[settings.LISTINGS_CACHE_ALIAS].clear()
+
+
+class ListingQueryPlanTests(SeededDataTestCase):
+    def test_listing_page_walks_location_index(self):
+        queryset = project(nearby_items(self.organization.location, RADIUS_M))[:11]
+        plan = explain_queryset(queryset)
+
+        self.assertUsesIndex(plan, LOCATION_INDEX)
+        self.assertNoSeqScan(plan)
+        # KNN order means a page reads about a page of rows, not the whole radius
+        self.assertLessEqual(plan['Actual Rows'], 11)
+        self.assertRowsExamined(plan, 500)
+
+    def test_category_listing_avoids_seq_scan(self):
+        queryset = project(nearby_items(self.organization.location, RADIUS_M, category=0))[:11]
+        self.assertNoSeqScan(explain_queryset(queryset))
+
+    def test_radius_row_estimate(self):
+        for radius_m in (1000, RADIUS_M, 25000):
+            with self.subTest(radius_m=radius_m):
+                queryset = nearby_items(self.organization.location, radius_m)
+                self.assertEstimateClose(estimate_count(queryset), queryset.count())
+
+
+class ReservationQueryPlanTests(SeededDataTestCase):
+    def test_reserve_nearest_walks_location_index(self):
+        candidates = nearest_candidates(self.organization.location, 10, RADIUS_M, None)
+        plan = explain(*update_locked_sql(candidates, self.organization.pk, timezone.now() + timedelta(hours=1)))
+
+        self.assertUsesIndex(plan, LOCATION_INDEX)
+        self.assertNoSeqScan(plan)
+        self.assertLessEqual(plan['Actual Rows'], 10)
+
+    def test_reserve_by_ids_uses_primary_key(self):
+        item_ids = list(nearby_items(self.organization.location, RADIUS_M).values_list('pk', flat=True)[:20])
+        candidates = id_candidates(item_ids)
+        plan = explain(*update_locked_sql(candidates, self.organization.pk, timezone.now() + timedelta(hours=1)))
+
+        self.assertUsesIndex(plan, f'{ITEM_TABLE}_pkey')
+        self.assertNoSeqScan(plan)
+        self.assertEqual(plan['Actual Rows'], len(item_ids))
+
+    def test_release_expired_uses_reserved_till_index(self):
+        plan = explain(*update_locked_sql(expired_candidates(100), None, None))
+
+        self.assertUsesIndex(plan, 'item_reserved_till_idx')
+        self.assertNoSeqScan(plan)
+        self.assertGreater(plan['Actual Rows'], 0)
+
+
+class DonateQueryPlanTests(SeededDataTestCase):
+    def test_new_item_is_listed_through_location_index(self):
+        item = Item.objects.create(
+            posted_by=self.samaritan, category=1, description='Plan test donation',
+            pickup_location=self.organization.location
+        )
+        plan = explain_queryset(project(nearby_items(self.organization.location, RADIUS_M))[:1])
+
+        self.assertUsesIndex(plan, LOCATION_INDEX)
+        self.assertEqual(project(nearby_items(self.organization.location, 1))[0][0], item.pk)
+
+
+class ListingCacheInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            'create_dummy_data', users=5, orgs=1, items=200, seed=7, credentials='', stdout=io.StringIO()
+        )
+        cls.organization = Organization.objects.get()
+        cls.samaritan = Samaritan.objects.order_by('pk').first()
+
+    def setUp(self):
+        caches[settings.LISTINGS_CACHE_ALIAS].clear()
+
+    async def listed_ids(self):
+        response = await AsyncClient().get('/listings?radius=5', headers=auth_headers(self.organization))
+        self.assertEqual(response.status_code, 200, response.content)
+        return [item['id'] for item in json.loads(response.content)['items']]
+
+    async def test_released_item_reappears_in_cached_listing(self):
+        # Right at the organization, so it heads the first page once available
+        item = await Item.objects.acreate(
+            posted_by=self.samaritan, category=1, description='Lapsed hold',
+            pickup_location=self.organization.location,
+            reserved_by=self.organization, reserved_till=timezone.now() - timedelta(hours=1)
+        )
+        self.assertNotIn(item.pk, await self.listed_ids())
+        # Served from the cache now
+        self.assertNotIn(item.pk, await self.listed_ids())
+
+        # What the reservation-sweeper runs (handle() would close the test's connection)
+        await sync_to_async(ReleaseExpiredCommand().sweep)(1000)
+
+        self.assertEqual((await self.listed_ids())[0], item.pk)
+
+
+class EndpointQueryCountTests(SeededDataTestCase):
+    """
+    Upper bounds on queries per request, authentication included and with
+    the listings cache cold. Savepoints of atomic blocks count as queries.
+    """
+    async def request(self, method, path, account, body=None, expected_status=200):
+        client = AsyncClient()
+        with instrumentation.track() as stats:
+            if method == 'GET':
+                response = await client.get(path, headers=auth_headers(account))
+            else:
+                response = await client.post(
+                    path, data=json.dumps(body), content_type='application/json', headers=auth_headers(account)
+                )
+        self.assertEqual(response.status_code, expected_status, response.content)
+        return stats.queries
+
+    async def test_listings(self):
+        self.assertLessEqual(await self.request('GET', '/listings?radius=5', self.organization), 2)
+        self.assertLessEqual(await self.request('GET', '/listings?radius=5&count=estimated', self.organization), 3)
+
+    async def test_categories(self):
+        self.assertLessEqual(await self.request('GET', '/categories', self.organization), 1)
+
+    async def test_donate(self):
+        body = {
+            'category': 1,
+            'description': 'Query count donation',
+            'pickup_location': {'longitude': self.organization.location.x, 'latitude': self.organization.location.y},
+        }
+        self.assertLessEqual(await self.request('POST', '/samaritan/donate', self.samaritan, body, 201), 2)
+
+    async def test_reserve(self):
+        body = {'nearest': 5, 'radius': 5}
+        self.assertLessEqual(await self.request('POST', '/organization/reserve', self.organization, body), 4)
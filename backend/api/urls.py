@@ -5,12 +5,18 @@ from .views import ItemView
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('metrics', views.metrics, name='metrics'),
     path('items', ItemView.as_view(), name='items'),
 
     path('categories', views.get_categories, name="view_categories"),
     path('listings', views.get_item_listings_for_organizations, name='view_item_listings'),
+    path('listings/changes', views.get_listing_changes, name='view_listing_changes'),
+    path('listings/export', views.export_items, name='export_items'),
+
+    path('organization/reserve', views.reserve_items, name='reserve_items'),
 
     path('samaritan/donate', views.donate_item, name='donate_items'),
+    path('samaritan/donate/batch', views.donate_items_batch, name='donate_items_batch'),
 
     path('auth/organization/signup', views.signup_organization, name='signup_organization'),
     path('auth/samaritan/signup', views.signup_samaritan, name='signup_samaritan'),
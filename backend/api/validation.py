@@ -1,7 +1,11 @@
 import re
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 from typing import Dict, List, Union, Tuple
+from django.conf import settings
+from django.contrib.gis.geos import Point
 from django.http import JsonResponse
-from .models import Item, Organization, Samaritan, User
+from .models import Item
 # from django.contrib.gis.geos import Point
 
 def validate_coordinates(location_data):
@@ -33,6 +37,19 @@ def validate_coordinates(location_data):
     except (ValueError, TypeError):
         return False, "Invalid coordinate values - must be valid numbers"
 
+def validate_service_radius(radius_km):
+    """
+    Validate an organization's service radius in kilometres.
+    Returns (is_valid, error_message)
+    """
+    try:
+        radius = float(radius_km)
+    except (ValueError, TypeError):
+        return False, "Service radius must be a number"
+    if not 0 < radius <= settings.REALTIME_MAX_RADIUS_KM:
+        return False, f"Service radius must be between 0 and {settings.REALTIME_MAX_RADIUS_KM} km"
+    return True, None
+
 def validate_postal_code(postal_code):
     """
     Validate Canadian postal code format.
@@ -61,29 +78,12 @@ def validate_province(province):
         
     return True, None
 
-def validate_unique_user(email, username):
-    """
-    Validate that email and username are unique for Samaritan.
-    Returns (is_valid, error_message)
-    """
-    try :
-        if User.objects.filter(email=email).exists():
-            return False, "A user with this email already exists"
-
-        if User.objects.filter(username=username).exists():
-            return False, "A user with this username already exists"
-    except Exception as e:
-        print("Error : ", str(e))
-        return False, "Unknown Error"
-        
-    return True, None
-
 def validate_category(category_data):
     """
     Validate item category value.
     Returns (is_valid, error_message, valid_categories_dict)
     """
-    if not category_data :
+    if category_data is None or category_data == '':
         return False, "Category is required", dict(Item.CATEGORY_CHOICES)
 
     try:
@@ -98,6 +98,116 @@ def validate_category(category_data):
     except (ValueError, TypeError):
         return False, "Category must be a number", dict(Item.CATEGORY_CHOICES)
 
+def validate_quantity(value, field_name):
+    """
+    Validate a positive weight or volume and round it (half up) to the
+    decimal places of its Item DecimalField, so the insert itself can never
+    fail on it.
+    Returns (is_valid, error_message, decimal_value)
+    """
+    label = field_name.capitalize()
+    if isinstance(value, bool):
+        return False, f"Invalid {field_name} format", None
+    try:
+        # Through str so floats from the JSON body keep their shortest form
+        quantity = Decimal(str(value))
+    except (InvalidOperation, ValueError, TypeError):
+        return False, f"Invalid {field_name} format", None
+    if not quantity.is_finite():
+        return False, f"{label} must be a finite number", None
+    if quantity <= 0:
+        return False, f"{label} must be positive", None
+
+    field = Item._meta.get_field(field_name)
+    # Checked before rounding, which would overflow the context precision
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    if quantity >= limit:
+        return False, f"{label} must be less than {limit}", None
+    quantity = quantity.quantize(Decimal(1).scaleb(-field.decimal_places), rounding=ROUND_HALF_UP)
+    if quantity >= limit:
+        return False, f"{label} must be less than {limit}", None
+    if quantity == 0:
+        return False, f"{label} is too small", None
+    return True, None, quantity
+
+def validate_unit(value, field_name):
+    """
+    Validate an optional weight or volume unit against its Item CharField.
+    Returns (is_valid, error_message)
+    """
+    if value is None:
+        return True, None
+    max_length = Item._meta.get_field(field_name).max_length
+    if not isinstance(value, str) or len(value) > max_length:
+        return False, f"{field_name} must be a string of at most {max_length} characters"
+    return True, None
+
+#------------------------------------------------------------ Donation Validation ------------------------------------------------------------#
+
+DONATION_REQUIRED_FIELDS = ['category', 'description', 'pickup_location']
+
+def validate_donation(data, today=None):
+    """
+    Validate one donated item as posted to the donate endpoints.
+    Returns (is_valid, error_dict, item_fields) where item_fields are the
+    cleaned Item constructor arguments (without posted_by).
+    """
+    if not isinstance(data, dict):
+        return False, {"error": "Item must be a JSON object"}, None
+
+    missing_fields = [field for field in DONATION_REQUIRED_FIELDS if field not in data]
+    if missing_fields:
+        return False, {
+            "error": "Missing required fields",
+            "missing_fields": missing_fields
+        }, None
+
+    valid, error, valid_categories = validate_category(data.get('category'))
+    if not valid:
+        return False, {"error": error, "options": valid_categories}, None
+
+    description = data['description']
+    if not isinstance(description, str) or not description.strip():
+        return False, {"error": "Description must be a non-empty string"}, None
+
+    location = data['pickup_location']
+    valid, error = validate_coordinates(location)
+    if not valid:
+        return False, {"error": error}, None
+
+    quantities = {}
+    for field_name in ('weight', 'volume'):
+        quantities[field_name] = data.get(field_name)
+        if quantities[field_name] is not None:
+            valid, error, quantities[field_name] = validate_quantity(quantities[field_name], field_name)
+            if not valid:
+                return False, {"error": error}, None
+
+    for field_name in ('weight_unit', 'volume_unit'):
+        valid, error = validate_unit(data.get(field_name), field_name)
+        if not valid:
+            return False, {"error": error}, None
+
+    best_before = data.get('best_before')
+    if best_before:
+        try:
+            best_before = datetime.strptime(best_before, '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            return False, {"error": "Invalid best_before date format. Use YYYY-MM-DD"}, None
+        if best_before < (today or date.today()):
+            return False, {"error": "Best before date cannot be in the past"}, None
+
+    return True, None, {
+        'category': int(data['category']),
+        'description': description,
+        'pickup_location': Point(float(location['longitude']), float(location['latitude'])),
+        'weight': quantities['weight'],
+        'weight_unit': data.get('weight_unit'),
+        'volume': quantities['volume'],
+        'volume_unit': data.get('volume_unit'),
+        'best_before': best_before or None,
+    }
+
 #------------------------------------------------------------ Organization Validation ------------------------------------------------------------#
 
 def validate_organization_required_fields(data):
@@ -150,6 +260,12 @@ def validate_organization_data(data):
     if not coords_valid:
         return False, coords_error
 
+    # Validate optional service radius
+    if data.get('service_radius_km') is not None:
+        radius_valid, radius_error = validate_service_radius(data['service_radius_km'])
+        if not radius_valid:
+            return False, radius_error
+
     # Get address data
     address_data = data.get('address', {})
     
@@ -167,14 +283,6 @@ def validate_organization_data(data):
     if not province_valid:
         return False, province_error
 
-    # Validate unique user
-    unique_valid, unique_error = validate_unique_user(
-        data.get('email', ''), 
-        data.get('username', '')
-    )
-    if not unique_valid:
-        return False, unique_error
-
     return True, None
 
 #------------------------------------------------------------ Samaritan Validation ------------------------------------------------------------#
@@ -231,12 +339,4 @@ def validate_samaritan_data(data):
     if not province_valid:
         return False, province_error
 
-    # Validate unique user
-    unique_valid, unique_error = validate_unique_user(
-        data.get('email', ''), 
-        data.get('username', '')
-    )
-    if not unique_valid:
-        return False, unique_error
-
     return True, None
\ No newline at end of file
@@ -1,27 +1,53 @@
-from datetime import date, datetime
+from datetime import date, timedelta
+import hmac
 import os
 import json
-import re
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import D, Distance 
-from django.contrib.gis.db.models.functions import Distance as DistanceDBFunction
 
 from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from django.views import View
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
-from django.contrib.auth import authenticate, login, logout
-
-from api.jwt import generate_jwt_token, token_required
-from api.validation import validate_category, validate_coordinates, validate_organization_data, validate_samaritan_data
-
-from .models import Organization, Item, Samaritan
+from api import changes, hashing, listing_cache, realtime
+from api import metrics as api_metrics
+from api.export import EXPORT_FORMATS, astream_items
+from api.hashing import HashingPoolSaturated
+from api.jwt import forget_token, generate_jwt_token, token_required
+from api.responses import FastJsonResponse, dumps
+from api.reservations import reserve_by_ids, reserve_nearest
+from api.signup import SignupConflict, create_account
+from api.listings import (
+    ITEM_COLUMNS, InvalidCursor, aestimate_count, apage_after, available_items, nearby_items, project,
+    serialize_item, serialize_listing, within_radius
+)
+from api.validation import validate_donation, validate_organization_data, validate_samaritan_data
+
+from .models import Organization, Item, Samaritan, User
+
+# Item ids are bigint (BigAutoField); larger values would fail in the database
+MAX_ITEM_ID = 2 ** 63 - 1
 
 
 def index(request):
     return JsonResponse({'msg': 'API is running'}, status=200)
 
+def metrics(request):
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not settings.METRICS_TOKEN or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+    body, content_type = api_metrics.render()
+    return HttpResponse(body, content_type=content_type)
+
+def hashing_busy():
+    response = JsonResponse({'error': 'Server is busy, please retry shortly'}, status=503)
+    response['Retry-After'] = '1'
+    return response
+
 #------------------------------------------------- Auth Views -------------------------------------------------#
 @csrf_exempt
 def signup_organization(request):
@@ -46,13 +72,6 @@ def signup_organization(request):
         point = Point(location_data['longitude'], location_data['latitude'])
         address_data = data.pop('address')
         
-        user_data = {
-            'username': data.get('username'),
-            'email': data.get('email'),
-            'password': data.get('password'),
-            'is_staff':False
-        }
-        
         # Create organization-specific data dictionary
         org_data = {
             'name': data.get('name'),
@@ -63,19 +82,22 @@ def signup_organization(request):
             'province': address_data.get('province'),
             'postal_code': address_data.get('postal_code'),
         }
+        if data.get('service_radius_km') is not None:
+            org_data['service_radius_km'] = float(data['service_radius_km'])
         
-        organization = Organization.objects.create(
-            **user_data,
-            **org_data
-        )
-        
-        organization.set_password(user_data['password'])
-        organization.save()
-        
-        print("Testing...")
-        print(organization.username)
+        try:
+            organization = create_account(
+                Organization,
+                data.get('username'),
+                data.get('email'),
+                data.get('password'),
+                **org_data
+            )
+        except SignupConflict as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
         token = generate_jwt_token({
+            'user_id': organization.pk,
             'username': organization.username,
             'email': organization.email,
             'is_staff': False,
@@ -97,6 +119,8 @@ def signup_organization(request):
         
         return response
     
+    except HashingPoolSaturated:
+        return hashing_busy()
     except Exception as e:
         print(f"Error during user creation: {str(e)}")
         return JsonResponse({
@@ -121,13 +145,6 @@ def signup_samaritan(request):
         if not is_valid:
             return JsonResponse({'error': error_message}, status=400)
         
-        user_data = {
-            'username': data.get('username'),
-            'email': data.get('email'),
-            'password': data.get('password'),
-            'is_staff':False
-        }
-        
         address_data = data.pop('address')
 
         org_data = {
@@ -135,15 +152,19 @@ def signup_samaritan(request):
             'province': address_data.get('province'),
         }
         
-        samaritan = Samaritan.objects.create(
-            **user_data,
-            **org_data
-        )
-        
-        samaritan.set_password(user_data['password'])
-        samaritan.save()
+        try:
+            samaritan = create_account(
+                Samaritan,
+                data.get('username'),
+                data.get('email'),
+                data.get('password'),
+                **org_data
+            )
+        except SignupConflict as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
         token = generate_jwt_token({
+            'user_id': samaritan.pk,
             'username': samaritan.username,
             'email': samaritan.email,
             'is_staff': False,
@@ -165,6 +186,8 @@ def signup_samaritan(request):
         
         return response
     
+    except HashingPoolSaturated:
+        return hashing_busy()
     except Exception as e:
         print(f"Error during user creation: {str(e)}")
         return JsonResponse({
@@ -172,7 +195,7 @@ def signup_samaritan(request):
         }, status=500)
 
 @csrf_exempt
-def login(request):
+async def login(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Invalid request method'}, status=400)
     
@@ -181,15 +204,24 @@ def login(request):
         username = data.get('username')
         password = data.get('password')
         
-        user = authenticate(username=username, password=password)
+        # Same checks as ModelBackend.authenticate, with the hash verified on the hashing pool
+        user = await User.objects.filter(username=username).afirst() if username else None
+        if user is None:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            await hashing.amake_password(password)
+        elif not (user.is_active and await hashing.acheck_password(
+            password, user.password, hashing.upgrade_setter(user)
+        )):
+            user = None
         
         if user is not None:
             if user.user_type == 'organization':
-                specific_user = Organization.objects.get(user=user)
+                specific_user = await Organization.objects.aget(user=user)
             else:  # samaritan
-                specific_user = Samaritan.objects.get(user=user)
+                specific_user = await Samaritan.objects.aget(user=user)
             
             token_payload = {
+                'user_id': specific_user.pk,
                 'username': specific_user.username,
                 'email': specific_user.email,
                 'is_staff': False,
@@ -216,7 +248,9 @@ def login(request):
             
     except json.JSONDecodeError:
         return JsonResponse({'error': 'Invalid JSON data'}, status=400)
-    except (Organization.DoesNotExist, Samaritan.DoesNotExist) as e:
+    except HashingPoolSaturated:
+        return hashing_busy()
+    except (Organization.DoesNotExist, Samaritan.DoesNotExist):
         return JsonResponse({'error': 'User type mismatch'}, status=400)
     except Exception as e:
         print(f"Login error: {str(e)}")
@@ -229,6 +263,7 @@ def logout(request):
         return JsonResponse({'error': 'Invalid request method'}, status=400)
     
     try:
+        forget_token(request.auth_token)
         response = JsonResponse({'message': 'Successfully logged out'})
         response.delete_cookie(key='jwt')
         return response
@@ -318,9 +353,19 @@ def logout(request):
 
 
 #------------------------------------------------- App Views -------------------------------------------------#
+def listing_response(body):
+    """
+    Listings change with every donation: clients may store them but must
+    revalidate, which ConditionalGetMiddleware answers with 304 when unchanged.
+    """
+    response = FastJsonResponse(body=body, status=200)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
 @csrf_exempt
 @token_required()
-def get_categories(request):
+@cache_control(private=True, max_age=settings.CATEGORIES_MAX_AGE)
+async def get_categories(request):
     try:
         categories = dict(Item.CATEGORY_CHOICES)
         return JsonResponse({
@@ -331,7 +376,7 @@ def get_categories(request):
 
 @csrf_exempt
 @token_required()
-def donate_item(request):
+async def donate_item(request):
     if request.method != 'POST':
         return JsonResponse({
             "error": "Method not allowed"
@@ -350,85 +395,19 @@ def donate_item(request):
                 "error": "Invalid JSON format"
             }, status=400)
         
-        required_fields = ['category', 'description', 'pickup_location']
-        missing_fields = [field for field in required_fields if field not in data]
-        if missing_fields:
-            return JsonResponse({
-                "error": "Missing required fields",
-                "missing_fields": missing_fields
-            }, status=400)
-
-        category = data.get('category', None)
-        valid, error, valid_categories = validate_category(category)
-        if not valid:
-            return JsonResponse({
-                "error": error,
-                "options": valid_categories
-            }, status=400)
-        
-
-        location = data['pickup_location']
-        valid, error = validate_coordinates(location)
-        if not valid:
-            return JsonResponse({
-                "error": error
-            }, status=400)
-            
-        pickup_location = Point(location['longitude'], location['latitude'])
-        
-        try:
-            weight = data.get('weight')
-            if weight is not None:
-                weight = float(weight)
-                if weight <= 0:
-                    return JsonResponse({"error": "Weight must be positive"}, status=400)
-            
-            volume = data.get('volume')
-            if volume is not None:
-                volume = float(volume)
-                if volume <= 0:
-                    return JsonResponse({"error": "Volume must be positive"}, status=400)
-        except (ValueError, TypeError):
-            return JsonResponse({
-                "error": "Invalid weight or volume format"
-            }, status=400)
-        
-        # Validate best_before date --------------------> not needed ?
-        best_before = data.get('best_before')
-        if best_before:
-            try:
-                best_before = datetime.strptime(best_before, '%Y-%m-%d').date()
-                if best_before < date.today():
-                    return JsonResponse({
-                        "error": "Best before date cannot be in the past"
-                    }, status=400)
-            except ValueError:
-                return JsonResponse({
-                    "error": "Invalid best_before date format. Use YYYY-MM-DD"
-                }, status=400)
+        is_valid, error, item_fields = validate_donation(data)
+        if not is_valid:
+            return JsonResponse(error, status=400)
         
-        # Get the samaritan
-        try:
-            samaritan = Samaritan.objects.get(username=request.username)
-        except Samaritan.DoesNotExist:
-            return JsonResponse({
-                "error": "Samaritan not found"
-            }, status=404)
+        samaritan = request.profile
         
         # Create the item
-        item = Item.objects.create(
-            category=category,
-            description=data['description'],
-            pickup_location=pickup_location,
-            posted_by=samaritan,
-            weight=weight if 'weight' in data else None,
-            weight_unit=data.get('weight_unit'),
-            volume=volume if 'volume' in data else None,
-            volume_unit=data.get('volume_unit'),
-            best_before=best_before if best_before else None
-        )
+        item = await Item.objects.acreate(posted_by=samaritan, **item_fields)
+        pickup_location = item.pickup_location
+        await listing_cache.ainvalidate_point(pickup_location.x, pickup_location.y)
+        await sync_to_async(realtime.publish_items)([item], samaritan)
         
-        return JsonResponse({
+        return FastJsonResponse({
             "message": "Item donated successfully",
             "item": {
                 "id": item.id,
@@ -463,15 +442,100 @@ def donate_item(request):
             "error": f"Internal server error: {str(e)}"
         }, status=500)
     
+def parse_donation_batch(request):
+    """
+    Decode a batch donation body: a JSON array, {"items": [...]} or NDJSON.
+    Returns (rows, error_message); NDJSON lines that fail to parse become
+    json.JSONDecodeError entries so they are reported per row.
+    """
+    body = request.body.decode('utf-8', errors='replace')
+    if request.content_type != 'application/x-ndjson':
+        try:
+            data = json.loads(body)
+        except json.JSONDecodeError:
+            return None, "Invalid JSON format"
+        if isinstance(data, dict):
+            data = data.get('items')
+        if not isinstance(data, list):
+            return None, "Expected a list of items"
+        return data, None
+
+    rows = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            rows.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            rows.append(e)
+    return rows, None
+
+@csrf_exempt
+@token_required(allowed_user_types=['samaritan'])
+async def donate_items_batch(request):
+    if request.method != 'POST':
+        return JsonResponse({
+            "error": "Method not allowed"
+        }, status=405)
+    
+    try:
+        rows, error = parse_donation_batch(request)
+        if error:
+            return JsonResponse({"error": error}, status=400)
+        if not rows:
+            return JsonResponse({"error": "No items provided"}, status=400)
+        if len(rows) > settings.DONATION_BATCH_MAX_ITEMS:
+            return JsonResponse({
+                "error": f"At most {settings.DONATION_BATCH_MAX_ITEMS} items per batch"
+            }, status=413)
+        
+        today = date.today()
+        items = []
+        errors = []
+        for index, row in enumerate(rows):
+            if isinstance(row, json.JSONDecodeError):
+                errors.append({"index": index, "error": "Invalid JSON format"})
+                continue
+            is_valid, row_error, item_fields = validate_donation(row, today)
+            if is_valid:
+                items.append(Item(posted_by=request.profile, **item_fields))
+            else:
+                errors.append({"index": index, **row_error})
+        
+        if not items:
+            return JsonResponse({
+                "error": "No valid items",
+                "errors": errors
+            }, status=400)
+        
+        # One INSERT ... RETURNING per batch_size rows, all in a single transaction
+        items = await Item.objects.abulk_create(items, batch_size=settings.DONATION_BATCH_INSERT_SIZE)
+        await listing_cache.ainvalidate_points(
+            [(item.pickup_location.x, item.pickup_location.y) for item in items]
+        )
+        await sync_to_async(realtime.publish_items)(items, request.profile)
+        
+        return FastJsonResponse({
+            "message": "Items donated successfully",
+            "created": len(items),
+            "item_ids": [item.id for item in items],
+            "errors": errors
+        }, status=201)
+        
+    except Exception as e:
+        return JsonResponse({
+            "error": f"Internal server error: {str(e)}"
+        }, status=500)
+    
 @csrf_exempt
 @token_required()
-def get_item_listings_for_organizations(request):
+async def get_item_listings_for_organizations(request):
 
     if request.user_type != 'organization':
         return JsonResponse({"error": "forbidden for samaritans"}, status=403)
     
     try:
-        organization = Organization.objects.get(username=request.username)
+        organization = request.profile
         if not organization.location:
             return JsonResponse({"error": "Organization location not set"}, status=400)
         
@@ -482,12 +546,17 @@ def get_item_listings_for_organizations(request):
         except ValueError:
             return JsonResponse({"error": "Invalid items_per_page parameter"}, status=400)
             
-        try:
-            page_number = int(request.GET.get('page', 1))
-            if page_number <= 0:
-                return JsonResponse({"error": "Page number must be positive"}, status=400)
-        except ValueError:
-            return JsonResponse({"error": "Invalid page number"}, status=400)
+        cursor = request.GET.get('cursor') or None
+        # Page numbers were replaced by cursors; serving page 1 again for
+        # ?page=3 would look like a short, repeating list to old clients
+        if request.GET.get('page', '1') != '1':
+            return JsonResponse({
+                "error": "page is no longer supported; follow next_cursor with ?cursor= instead"
+            }, status=400)
+
+        count_mode = request.GET.get('count')
+        if count_mode not in (None, 'exact', 'estimated'):
+            return JsonResponse({"error": "count must be 'exact' or 'estimated'"}, status=400)
         
         try:
             radius_km = float(request.GET.get('radius', os.getenv('DEFAULT_RADIUS', 5)))
@@ -513,92 +582,252 @@ def get_item_listings_for_organizations(request):
                 "valid_categories": dict(Item.CATEGORY_CHOICES)
             }, status=400)
         
-        queryset = Item.objects.filter(
-            reserved_by__isnull=True,
-            is_picked_up=False,
-            reserved_till__isnull=True
-        )
-
-        if category is not None:
-            queryset = queryset.filter(category=category)
+        cache_key = None
+        if listing_cache.is_cacheable(radius_km):
+            cache_key = await listing_cache.alisting_key(
+                organization, radius_km, category, cursor, items_per_page, count_mode
+            )
+            cached = await listing_cache.aget_listing(cache_key)
+            if cached is not None:
+                return listing_response(cached)
         
         try:
-            queryset = Item.objects.filter(pickup_location__distance_lte=(organization.location, D(m=radius_m)))
-
-            queryset = queryset.annotate(
-                distance=DistanceDBFunction('pickup_location', organization.location)
-            ).order_by('distance')
-
+            queryset = nearby_items(organization.location, radius_m, category)
         except Exception as e:
             print(f"Spatial query error: {str(e)}")
             raise Exception(f"Error processing location query: {str(e)}")
         
         try:
-            paginator = Paginator(queryset, items_per_page)
-            if page_number > paginator.num_pages and paginator.num_pages > 0:
-                return JsonResponse({"error": "Page number exceeds available pages"}, status=404)
-            page_obj = paginator.get_page(page_number)
-        except Exception as e:
-            return JsonResponse({"error": f"Pagination error: {str(e)}"}, status=500)
-        
-        print("Pagination Complete")
+            page_rows, next_cursor = await apage_after(project(queryset), cursor, items_per_page)
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid cursor"}, status=400)
         
-        items_data = []
-        for item in page_obj:
-            try:
-                item_data = {
-                    'id': item.id,
-                    'category': {
-                        'id': item.category,
-                        'name': dict(Item.CATEGORY_CHOICES)[item.category]
-                    },
-                    'description': item.description,
-                    'pickup_location': {
-                        'latitude': item.pickup_location.y,
-                        'longitude': item.pickup_location.x
-                    },
-                    'distance_km': round(item.distance.km, 2) if hasattr(item, 'distance') else None,
-                    'posted_by': {
-                        'id': item.posted_by.id,
-                        'username': item.posted_by.username
-                    }
-                }
-                
-                if item.weight is not None:
-                    item_data['weight'] = {
-                        'value': float(item.weight),
-                        'unit': item.weight_unit
-                    }
-                
-                if item.volume is not None:
-                    item_data['volume'] = {
-                        'value': float(item.volume),
-                        'unit': item.volume_unit
-                    }
-                
-                if item.best_before is not None:
-                    item_data['best_before'] = item.best_before.isoformat()
-                
-                if item.pickup_time is not None:
-                    item_data['pickup_time'] = item.pickup_time.isoformat()
-                
-                items_data.append(item_data)
-                
-            except Exception as e:
-                return JsonResponse({
-                    "error": f"Error processing item data: {str(e)}"
-                }, status=500)
+        items_data = [serialize_listing(row) for row in page_rows]
         
-        return JsonResponse({
-            "page": page_number,
-            "total_pages": paginator.num_pages,
-            "total_items": paginator.count,
+        response_data = {
             "items": items_data,
-            "categories": dict(Item.CATEGORY_CHOICES)
+            "next_cursor": next_cursor
+        }
+        if count_mode == 'exact':
+            response_data["total_items"] = await queryset.acount()
+        elif count_mode == 'estimated':
+            response_data["estimated_total_items"] = await aestimate_count(queryset)
+        
+        # Cache the encoded body so hits skip serialization entirely
+        body = dumps(response_data)
+        if cache_key is not None:
+            await listing_cache.aset_listing(cache_key, body)
+        
+        return listing_response(body)
+        
+    except Exception as e:
+        return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
+
+
+@csrf_exempt
+@token_required(allowed_user_types=['organization'])
+async def get_listing_changes(request):
+    """
+    Items added to, changed in or removed from the organization's listings
+    since a token. Without ?since= only a starting token is returned; clients
+    take a full snapshot (listings or export) first and poll from there.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    
+    try:
+        organization = request.profile
+        if not organization.location:
+            return JsonResponse({"error": "Organization location not set"}, status=400)
+        
+        try:
+            radius_km = float(request.GET.get('radius', os.getenv('DEFAULT_RADIUS', 5)))
+            if radius_km <= 0:
+                return JsonResponse({"error": "Radius must be positive"}, status=400)
+        except ValueError:
+            return JsonResponse({"error": "Invalid radius parameter"}, status=400)
+        
+        try:
+            category = request.GET.get('category')
+            if category is not None:
+                category = int(category)
+                if category not in dict(Item.CATEGORY_CHOICES):
+                    return JsonResponse({
+                        "error": "Invalid category",
+                        "valid_categories": dict(Item.CATEGORY_CHOICES)
+                    }, status=400)
+        except ValueError:
+            return JsonResponse({
+                "error": "Category must be a number",
+                "valid_categories": dict(Item.CATEGORY_CHOICES)
+            }, status=400)
+        
+        until = changes.settled_now()
+        since = request.GET.get('since')
+        if not since:
+            return JsonResponse({"items": [], "removed": [], "next_token": changes.encode_token(until)}, status=200)
+        
+        try:
+            since = changes.decode_token(since)
+        except InvalidCursor:
+            return JsonResponse({"error": "Invalid token"}, status=400)
+        if since >= until:
+            return JsonResponse({"items": [], "removed": [], "next_token": changes.encode_token(since)}, status=200)
+        
+        rows, removed, truncated = await changes.achanges_since(
+            organization.location, radius_km * 1000, category, since, until, settings.CHANGES_MAX_ITEMS
+        )
+        if truncated:
+            return JsonResponse({
+                "error": "Too many changes since token, resync required",
+                "next_token": changes.encode_token(until)
+            }, status=410)
+        
+        return FastJsonResponse({
+            "items": [serialize_listing(row) for row in rows],
+            "removed": removed,
+            "next_token": changes.encode_token(until)
         }, status=200)
         
-    except Organization.DoesNotExist:
-        return JsonResponse({"error": "Organization not found"}, status=404)
+    except Exception as e:
+        return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
+
+
+@csrf_exempt
+@token_required(allowed_user_types=['organization'])
+async def export_items(request):
+    """
+    Stream every available item in the organization's radius as NDJSON
+    (default) or CSV, for mirroring into external inventory tools.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    
+    try:
+        organization = request.profile
+        if not organization.location:
+            return JsonResponse({"error": "Organization location not set"}, status=400)
+        
+        export_format = request.GET.get('format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return JsonResponse({"error": "format must be 'ndjson' or 'csv'"}, status=400)
+        
+        try:
+            radius_km = float(request.GET.get('radius', os.getenv('DEFAULT_RADIUS', 5)))
+            if not 0 < radius_km <= settings.EXPORT_MAX_RADIUS_KM:
+                return JsonResponse({
+                    "error": f"Radius must be between 0 and {settings.EXPORT_MAX_RADIUS_KM} km"
+                }, status=400)
+        except ValueError:
+            return JsonResponse({"error": "Invalid radius parameter"}, status=400)
+        
+        try:
+            categories = {int(category) for category in request.GET.get('categories', '').split(',') if category}
+        except ValueError:
+            return JsonResponse({
+                "error": "Categories must be comma separated numbers",
+                "valid_categories": dict(Item.CATEGORY_CHOICES)
+            }, status=400)
+        if not categories.issubset(dict(Item.CATEGORY_CHOICES)):
+            return JsonResponse({
+                "error": "Invalid category",
+                "valid_categories": dict(Item.CATEGORY_CHOICES)
+            }, status=400)
+        
+        queryset = available_items()
+        if categories:
+            queryset = queryset.filter(category__in=categories)
+        queryset = within_radius(queryset, organization.location, radius_km * 1000)
+        
+        response = StreamingHttpResponse(
+            astream_items(queryset, export_format, settings.EXPORT_CHUNK_SIZE),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="items.{export_format}"'
+        # Let nginx pass chunks through as they are produced
+        response['X-Accel-Buffering'] = 'no'
+        return response
+        
+    except Exception as e:
+        return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
+
+
+@csrf_exempt
+@token_required(allowed_user_types=['organization'])
+async def reserve_items(request):
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    
+    try:
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({"error": "Invalid JSON format"}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Expected a JSON object"}, status=400)
+        
+        organization = request.profile
+        max_items = settings.RESERVATION_MAX_ITEMS
+        
+        try:
+            hold_minutes = int(data.get('hold_minutes', settings.RESERVATION_HOLD_MINUTES))
+            if not 0 < hold_minutes <= settings.RESERVATION_MAX_HOLD_MINUTES:
+                return JsonResponse({
+                    "error": f"hold_minutes must be between 1 and {settings.RESERVATION_MAX_HOLD_MINUTES}"
+                }, status=400)
+        except (ValueError, TypeError):
+            return JsonResponse({"error": "Invalid hold_minutes parameter"}, status=400)
+        hold = timedelta(minutes=hold_minutes)
+        
+        item_ids = data.get('item_ids')
+        nearest = data.get('nearest')
+        if (item_ids is None) == (nearest is None):
+            return JsonResponse({"error": "Provide exactly one of item_ids or nearest"}, status=400)
+        
+        if item_ids is not None:
+            # Only a real JSON list of in-range integer ids; int() would also
+            # accept strings, dict keys and booleans
+            if not isinstance(item_ids, list) or not all(
+                isinstance(item_id, int) and not isinstance(item_id, bool)
+                and 0 < item_id <= MAX_ITEM_ID for item_id in item_ids
+            ):
+                return JsonResponse({"error": "item_ids must be a list of integers"}, status=400)
+            item_ids = set(item_ids)
+            if not 0 < len(item_ids) <= max_items:
+                return JsonResponse({"error": f"item_ids must contain 1 to {max_items} ids"}, status=400)
+            
+            reserved_till, claimed = await sync_to_async(reserve_by_ids)(organization, item_ids, hold)
+        else:
+            try:
+                nearest = int(nearest)
+                radius_km = float(data.get('radius', os.getenv('DEFAULT_RADIUS', 5)))
+                category = data.get('category')
+                category = int(category) if category is not None else None
+            except (ValueError, TypeError):
+                return JsonResponse({"error": "Invalid nearest, radius or category parameter"}, status=400)
+            if not 0 < nearest <= max_items:
+                return JsonResponse({"error": f"nearest must be between 1 and {max_items}"}, status=400)
+            if radius_km <= 0:
+                return JsonResponse({"error": "Radius must be positive"}, status=400)
+            if not organization.location:
+                return JsonResponse({"error": "Organization location not set"}, status=400)
+            
+            reserved_till, claimed = await sync_to_async(reserve_nearest)(
+                organization, nearest, radius_km * 1000, category, hold
+            )
+        
+        await listing_cache.ainvalidate_points([(longitude, latitude) for _, longitude, latitude in claimed])
+        
+        reserved = sorted(item_id for item_id, _, _ in claimed)
+        response_data = {
+            "reserved": reserved,
+            "reserved_till": reserved_till.isoformat(),
+        }
+        if item_ids is not None:
+            response_data["unavailable"] = sorted(item_ids.difference(reserved))
+        
+        return JsonResponse(response_data, status=200)
+        
     except Exception as e:
         return JsonResponse({"error": f"Internal server error: {str(e)}"}, status=500)
 
@@ -625,39 +854,14 @@ class ItemView(View):
         if category:
             queryset = queryset.filter(category=category)
 
-        queryset = queryset.filter(
-            pickup_location__distance_lte=(organization.location, radius_m)
-        ).annotate(
-            distance=Distance("pickup_location", organization.location)
-        ).order_by("distance")
+        queryset = project(within_radius(queryset, organization.location, radius_m), ITEM_COLUMNS)
 
         paginator = Paginator(queryset, items_per_page)
         page_obj = paginator.get_page(page_number)
 
-        items_data = [
-            {
-                "id": item.id,
-                "category": item.category,
-                "description": item.description,
-                "weight": item.weight,
-                "weight_unit": item.weight_unit,
-                "volume": item.volume,
-                "volume_unit": item.volume_unit,
-                "best_before": item.best_before,
-                "pickup_location": {
-                    "latitude": item.pickup_location.y,
-                    "longitude": item.pickup_location.x
-                },
-                "distance_km": round(item.distance.km, 2),
-                "reserved_till": item.reserved_till,
-                "posted_by": item.posted_by.id,
-                "pickup_time": item.pickup_time,
-                "is_picked_up": item.is_picked_up,
-            }
-            for item in page_obj
-        ]
+        items_data = [serialize_item(row) for row in page_obj]
 
-        return JsonResponse({
+        return FastJsonResponse({
             "page": page_number,
             "total_pages": paginator.num_pages,
             "total_items": paginator.count,
@@ -692,6 +896,7 @@ class ItemView(View):
 
         try:
             item.save()
+            listing_cache.invalidate_point(item.pickup_location.x, item.pickup_location.y)
             return JsonResponse({"success": "Item created successfully", "item_id": item.id}, status=201)
         except Exception as e:
             return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangotango.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up: the handler uses the ORM and settings
+from api.realtime import websocket_application  # noqa: E402
+from api.spatial_index import organization_index  # noqa: E402
+
+# Load the service areas in the background before the first donation needs them
+organization_index.start()
+
+
+async def application(scope, receive, send):
+    """
+    HTTP goes to Django; WebSocket connections (nginx proxies /ws/) go to the
+    listings push handler.
+    """
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
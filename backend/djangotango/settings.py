@@ -43,7 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so metrics and timings cover every other middleware
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # ETags are computed on the compressed body, so this stays above compression
+    'django.middleware.http.ConditionalGetMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -51,6 +57,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Innermost, so profiles show the view rather than the middleware stack
+    'api.middleware.ProfilerMiddleware',
 ]
 
 CORS_ALLOW_ALL_ORIGINS = True
@@ -89,6 +97,108 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Listing responses live in Redis when REDIS_URL is set (compose), shared by
+# every worker. Without it (runserver, tests) they stay in process memory.
+# FileBasedCache is deliberately not used: every set lists the cache directory
+# to decide whether to cull, an O(entries) scan on each listings miss.
+REDIS_URL = os.getenv('REDIS_URL')
+LISTINGS_CACHE_BACKEND = os.getenv(
+    'LISTINGS_CACHE_BACKEND',
+    'django.core.cache.backends.redis.RedisCache' if REDIS_URL else 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'listings': {
+        'BACKEND': LISTINGS_CACHE_BACKEND,
+        'LOCATION': os.getenv('LISTINGS_CACHE_LOCATION', REDIS_URL or 'listings'),
+        'TIMEOUT': int(os.getenv('LISTINGS_CACHE_TIMEOUT', '60')),
+    },
+}
+if not LISTINGS_CACHE_BACKEND.endswith('RedisCache'):
+    # Redis evicts by itself (maxmemory-policy); OPTIONS there go to the client
+    CACHES['listings']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('LISTINGS_CACHE_MAX_ENTRIES', '10000')),
+    }
+
+LISTINGS_CACHE_ALIAS = 'listings'
+LISTINGS_CACHE_CELL_DEGREES = float(os.getenv('LISTINGS_CACHE_CELL_DEGREES', '0.2'))
+LISTINGS_CACHE_MAX_RADIUS_KM = float(os.getenv('LISTINGS_CACHE_MAX_RADIUS_KM', '25'))
+
+# Bearer token Prometheus must send to /metrics (api.views.metrics); unset
+# disables the endpoint. The app port is published by compose, so nginx's
+# deny rule alone does not keep it private.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Share of requests timed by api.middleware.ServerTimingMiddleware (0 = off, 1 = all)
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv('SERVER_TIMING_SAMPLE_RATE', '0'))
+
+# On-demand request profiles (api.profiler), kept as a ring buffer on disk
+PROFILER_DIR = os.getenv('PROFILER_DIR', '/tmp/api-profiles')
+PROFILER_MAX_FILES = int(os.getenv('PROFILER_MAX_FILES', '50'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # One JSON object per sampled request
+        'api.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Response compression (api.middleware.CompressionMiddleware)
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# How long clients may reuse /categories without revalidating
+CATEGORIES_MAX_AGE = int(os.getenv('CATEGORIES_MAX_AGE', '86400'))
+
+# Encoder for api.responses.FastJsonResponse: 'auto' uses orjson when
+# installed, 'stdlib' forces the json module
+JSON_RESPONSE_BACKEND = os.getenv('JSON_RESPONSE_BACKEND', 'auto')
+
+# Delta sync (api.views.get_listing_changes)
+CHANGES_SETTLE_SECONDS = int(os.getenv('CHANGES_SETTLE_SECONDS', '5'))
+CHANGES_MAX_ITEMS = int(os.getenv('CHANGES_MAX_ITEMS', '1000'))
+
+# Streaming item export (api.views.export_items)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '2000'))
+EXPORT_MAX_RADIUS_KM = float(os.getenv('EXPORT_MAX_RADIUS_KM', '200'))
+
+# Batch donation limits (api.views.donate_items_batch)
+DONATION_BATCH_MAX_ITEMS = int(os.getenv('DONATION_BATCH_MAX_ITEMS', '1000'))
+DONATION_BATCH_INSERT_SIZE = int(os.getenv('DONATION_BATCH_INSERT_SIZE', '500'))
+
+# Item reservations by organizations (api.views.reserve_items)
+RESERVATION_MAX_ITEMS = int(os.getenv('RESERVATION_MAX_ITEMS', '500'))
+RESERVATION_HOLD_MINUTES = int(os.getenv('RESERVATION_HOLD_MINUTES', '120'))
+RESERVATION_MAX_HOLD_MINUTES = int(os.getenv('RESERVATION_MAX_HOLD_MINUTES', '1440'))
+
+# WebSocket push of new donations (api/realtime.py). Use
+# api.realtime.PostgresNotifyBroker when running more than one worker process
+# (sample.env does; gunicorn.conf.py refuses to start several workers without it).
+REALTIME_BROKER = os.getenv('REALTIME_BROKER', 'api.realtime.InProcessBroker')
+REALTIME_MAX_RADIUS_KM = float(os.getenv('REALTIME_MAX_RADIUS_KM', '100'))
+REALTIME_QUEUE_SIZE = int(os.getenv('REALTIME_QUEUE_SIZE', '100'))
+REALTIME_DESCRIPTION_LENGTH = int(os.getenv('REALTIME_DESCRIPTION_LENGTH', '500'))
+
+# In-memory index of organization service areas (api/spatial_index.py)
+ORGANIZATION_INDEX_CELL_DEGREES = float(os.getenv('ORGANIZATION_INDEX_CELL_DEGREES', '0.1'))
+ORGANIZATION_INDEX_REFRESH_SECONDS = int(os.getenv('ORGANIZATION_INDEX_REFRESH_SECONDS', '300'))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -107,6 +217,10 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Dedicated pool for PBKDF2 work in login/signup (see api/hashing.py)
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', '2'))
+PASSWORD_HASHING_QUEUE_DEPTH = int(os.getenv('PASSWORD_HASHING_QUEUE_DEPTH', '16'))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -135,4 +249,8 @@ AUTH_USER_MODEL = 'api.User'
 
 JWT_SECRET = os.getenv('JWT_SECRET', 'your-fallback-secret-key')
 JWT_EXPIRATION_DAYS = int(os.getenv('JWT_EXPIRATION_DAYS', '1'))
-JWT_EXPIRATION_DELTA = timedelta(days=JWT_EXPIRATION_DAYS)
\ No newline at end of file
+JWT_EXPIRATION_DELTA = timedelta(days=JWT_EXPIRATION_DAYS)
+
+# Verified-token cache used by api.jwt.token_required (per worker process)
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', '300'))
\ No newline at end of file
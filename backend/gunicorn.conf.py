@@ -0,0 +1,21 @@
+import os
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    # InProcessBroker only reaches sockets on the worker that handled the
+    # donation; with several workers most subscribers would silently miss pushes
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangotango.settings')
+    from django.conf import settings
+
+    if server.cfg.workers > 1 and settings.REALTIME_BROKER == 'api.realtime.InProcessBroker':
+        raise RuntimeError(
+            f'REALTIME_BROKER=api.realtime.InProcessBroker cannot serve {server.cfg.workers} workers; '
+            'set REALTIME_BROKER=api.realtime.PostgresNotifyBroker'
+        )
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a dead worker from the shared metrics directory
+    multiprocess.mark_process_dead(worker.pid)
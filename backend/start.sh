@@ -7,6 +7,10 @@ echo "ENV : $ENV"
 
 if [ "$ENV" = "prod" ]; then
     echo "Starting production server..."
+    # Shared by the workers' metrics (api/metrics.py); stale files would skew counters
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
     exec gunicorn --workers ${GUNICORN_WORKERS} --bind "0.0.0.0:${API_PORT}" djangotango.asgi:application -k uvicorn.workers.UvicornWorker
 else
     echo "Starting development server..."